@@ -1,14 +1,788 @@
-import requests
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import httpx
+import itertools
+import json
+import math
 import os
+import random
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
 from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).parent / ".env")
 
+from metrics import LLM_LATENCY, LLM_QUEUE_WAIT, add_stage_time, record_usage
+from answer_index import answer_index
+
 # Groq API Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_BASE_URL = "https://api.groq.com/openai/v1"
-AI_MODEL = "llama-3.3-70b-versatile"  # Groq model
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")  # override for a local stub
+AI_MODEL = os.getenv("AI_MODEL", "llama-3.3-70b-versatile")  # Groq model for chat and escalations
+AI_FAST_MODEL = os.getenv("AI_FAST_MODEL", "llama-3.1-8b-instant")  # small model for format-bound tasks
+
+# Model and sampling per AITutor task (keyed by the method label). Tasks on the fast
+# model are re-run once on AI_MODEL when their output fails the format parser.
+# AI_ROUTES='{"assess_answer": {"model": "llama-3.3-70b-versatile"}}' overrides entries.
+MODEL_ROUTES = {
+    "generate_response": {"model": AI_MODEL, "max_tokens": 800, "temperature": 0.9},
+    "tutor_chat": {"model": AI_MODEL, "max_tokens": 600, "temperature": 0.8},
+    "tutor_chat_stream": {"model": AI_MODEL, "max_tokens": 600, "temperature": 0.8},
+    "generate_practice_problem": {"model": AI_MODEL, "max_tokens": 600, "temperature": 0.9},
+    "generate_practice_problem_stream": {"model": AI_MODEL, "max_tokens": 600, "temperature": 0.9},
+    "assess_answer": {"model": AI_FAST_MODEL, "max_tokens": 300, "temperature": 0.1},
+    "generate_learning_path": {"model": AI_FAST_MODEL, "max_tokens": 250, "temperature": 0.3},
+    "summarize_conversation": {"model": AI_FAST_MODEL, "max_tokens": 250, "temperature": 0.3},
+}
+for _task, _overrides in json.loads(os.getenv("AI_ROUTES", "{}")).items():
+    MODEL_ROUTES[_task] = {**MODEL_ROUTES.get(_task, MODEL_ROUTES["generate_response"]), **_overrides}
+
+# HTTP client pool and timeouts (seconds)
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "100"))
+GROQ_MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "20"))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+GROQ_CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.getenv("GROQ_READ_TIMEOUT", "60"))
+GROQ_POOL_TIMEOUT = float(os.getenv("GROQ_POOL_TIMEOUT", "10"))
+GROQ_TOTAL_TIMEOUT = float(os.getenv("GROQ_TOTAL_TIMEOUT", "90"))
+GROQ_HTTP2 = os.getenv("GROQ_HTTP2", "True") == "True"
+
+# Retries for transport errors, timeouts and 5xx, with full-jitter exponential backoff
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+GROQ_RETRY_BASE_DELAY = float(os.getenv("GROQ_RETRY_BASE_DELAY", "0.5"))
+GROQ_RETRY_MAX_DELAY = float(os.getenv("GROQ_RETRY_MAX_DELAY", "8"))
+# Hedging: send a duplicate chat/grading request once the first outlives the recent p95
+GROQ_HEDGE_REQUESTS = os.getenv("GROQ_HEDGE_REQUESTS", "False") == "True"
+GROQ_HEDGE_MIN_DELAY = float(os.getenv("GROQ_HEDGE_MIN_DELAY", "1"))
+# Circuit breaker: open when this share of the last GROQ_BREAKER_WINDOW calls failed
+GROQ_BREAKER_WINDOW = int(os.getenv("GROQ_BREAKER_WINDOW", "20"))
+GROQ_BREAKER_MIN_CALLS = int(os.getenv("GROQ_BREAKER_MIN_CALLS", "10"))
+GROQ_BREAKER_THRESHOLD = float(os.getenv("GROQ_BREAKER_THRESHOLD", "0.5"))
+GROQ_BREAKER_COOLDOWN = float(os.getenv("GROQ_BREAKER_COOLDOWN", "30"))
+
+# Response cache for repeatable prompts (learning paths, practice problems)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "False") == "True"
+# Expired llm_cache rows are deleted by cache writes, at most this many rows every this many seconds
+LLM_CACHE_PURGE_INTERVAL = float(os.getenv("LLM_CACHE_PURGE_INTERVAL", "300"))
+LLM_CACHE_PURGE_BATCH = int(os.getenv("LLM_CACHE_PURGE_BATCH", "1000"))
+
+# LLM scheduler: concurrent upstream calls and Groq's per-model quotas (defaults: free
+# tier for llama-3.3-70b-versatile and llama-3.1-8b-instant); 0 disables a limit
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "16"))
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))  # AI_MODEL, and any model not listed
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "12000"))
+GROQ_FAST_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_FAST_REQUESTS_PER_MINUTE", "30"))  # AI_FAST_MODEL
+GROQ_FAST_TOKENS_PER_MINUTE = int(os.getenv("GROQ_FAST_TOKENS_PER_MINUTE", "6000"))
+# GROQ_MODEL_QUOTAS='{"gemma2-9b-it": {"requests_per_minute": 30, "tokens_per_minute": 15000}}' adds or overrides models
+GROQ_MODEL_QUOTAS = {
+    AI_MODEL: {"requests_per_minute": GROQ_REQUESTS_PER_MINUTE, "tokens_per_minute": GROQ_TOKENS_PER_MINUTE},
+    AI_FAST_MODEL: {"requests_per_minute": GROQ_FAST_REQUESTS_PER_MINUTE, "tokens_per_minute": GROQ_FAST_TOKENS_PER_MINUTE},
+}
+for _model, _quota in json.loads(os.getenv("GROQ_MODEL_QUOTAS", "{}")).items():
+    GROQ_MODEL_QUOTAS[_model] = {**GROQ_MODEL_QUOTAS.get(_model, GROQ_MODEL_QUOTAS[AI_MODEL]), **_quota}
+# Waiting calls before new low-priority work is rejected, and how long a
+# request-path call may wait for a slot (background work waits indefinitely)
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "100"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+
+# Lower rank is served first
+LLM_PRIORITIES = {
+    "chat": 0,
+    "grading": 1,
+    "generation": 2,
+    "background": 3,
+}
+
+
+difficulty_map = {
+    (0, 3): "easy",
+    (3, 7): "medium",
+    (7, 11): "hard"
+}
+
+
+def difficulty_bucket(difficulty: float) -> str:
+    """Map a 0-10 difficulty onto the easy/medium/hard prompt level"""
+    # Clamp difficulty to valid range so the map lookup never raises StopIteration
+    difficulty = max(0.0, min(difficulty, 10.9))
+    return next(level for (low, high), level in difficulty_map.items()
+                if low <= difficulty < high)
+
+
+class ProblemStreamParser:
+    """Splits a QUESTION/SOLUTION/HINTS completion into sections as the tokens arrive"""
+
+    # Each section ends where the next section's marker starts
+    MARKERS = (("question", "SOLUTION:"), ("solution", "HINTS:"))
+
+    def __init__(self):
+        self.text = ""
+        self.sections = {}
+        self._start = 0  # where the current section's text begins
+        self._scan = 0  # where to resume looking for the next marker
+
+    def feed(self, chunk: str) -> list:
+        """Add streamed text; returns the (section, value) pairs it completed"""
+        self.text += chunk
+        completed = []
+        while len(self.sections) < len(self.MARKERS):
+            section, marker = self.MARKERS[len(self.sections)]
+            index = self.text.find(marker, self._scan)
+            if index == -1:
+                # The marker may be split across chunks, so keep its possible start in range
+                self._scan = max(self._start, len(self.text) - len(marker) + 1)
+                break
+            completed.append(self._finish(section, self.text[self._start:index]))
+            self._start = self._scan = index + len(marker)
+        return completed
+
+    def close(self) -> list:
+        """Finish the stream; returns the remaining (section, value) pairs"""
+        if "question" not in self.sections:
+            # No SOLUTION marker: show the raw text and mark the problem unusable
+            return [self._finish("question", self.text, raw=True),
+                    self._finish("solution", "Solution generation failed"),
+                    self._finish("hints", "")]
+        completed = []
+        if "solution" not in self.sections:
+            completed.append(self._finish("solution", self.text[self._start:]))
+            completed.append(self._finish("hints", ""))
+        else:
+            completed.append(self._finish("hints", self.text[self._start:]))
+        return completed
+
+    def _finish(self, section: str, text: str, raw: bool = False) -> tuple:
+        if section == "question" and not raw:
+            text = text.replace("QUESTION:", "")
+        value = text.strip()
+        if section == "hints":
+            value = value.split(";") if value else []
+        self.sections[section] = value
+        return section, value
+
+    def result(self) -> dict:
+        return {
+            "question": self.sections["question"],
+            "solution": self.sections["solution"],
+            "hints": self.sections["hints"],
+        }
+
+
+def parse_assessment(response: str) -> tuple:
+    """(assessment, well_formed) for a CORRECT/SCORE/FEEDBACK grader reply"""
+    lines = response.split("\n")
+    correct_line = next((l for l in lines if l.strip().startswith("CORRECT:")), None)
+    is_correct = correct_line is not None and "Yes" in correct_line
+
+    score_line = next((l for l in lines if l.strip().startswith("SCORE:")), None)
+    try:
+        if score_line:
+            raw_score = score_line.split(":", 1)[1].strip().split("/")[0].strip()
+            score = int(float(raw_score))
+        else:
+            score = 100 if is_correct else 0
+    except (ValueError, OverflowError):
+        # Fallback: still return useful feedback even if parsing fails
+        return {"is_correct": False, "score": 0, "feedback": response}, False
+
+    feedback_parts = response.split("FEEDBACK:")
+    feedback = feedback_parts[1].strip() if len(feedback_parts) > 1 else response.strip()
+
+    assessment = {"is_correct": is_correct, "score": score, "feedback": feedback}
+    return assessment, correct_line is not None and score_line is not None
+
+
+def parse_learning_path(response: str) -> tuple:
+    """(topics, well_formed) for a numbered or bulleted list reply"""
+    topics = []
+    for line in response.split("\n"):
+        line = line.strip()
+        if line and (line[0].isdigit() or line.startswith("-")):
+            topic = line.lstrip("0123456789.-) ").strip()
+            if topic:
+                topics.append(topic)
+    return topics, bool(topics)
+
+
+def parse_problem(response: str) -> tuple:
+    """(problem, well_formed) for a QUESTION/SOLUTION/HINTS reply"""
+    parser = ProblemStreamParser()
+    parser.feed(response)
+    parser.close()
+    problem = parser.result()
+    return problem, problem["solution"] != "Solution generation failed"
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create the pooled keep-alive client used for all Groq calls"""
+    try:
+        import h2  # noqa: F401
+        http2 = GROQ_HTTP2
+    except ImportError:
+        http2 = False
+
+    return httpx.AsyncClient(
+        base_url=GROQ_BASE_URL,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+            keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=GROQ_CONNECT_TIMEOUT,
+            read=GROQ_READ_TIMEOUT,
+            write=GROQ_CONNECT_TIMEOUT,
+            pool=GROQ_POOL_TIMEOUT,
+        ),
+    )
+
+
+class ResponseCache:
+    """Two-tier cache for LLM completions: in-process LRU plus an optional DB table"""
+
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL, persist: bool = LLM_CACHE_PERSIST,
+                 purge_interval: float = LLM_CACHE_PURGE_INTERVAL, purge_batch: int = LLM_CACHE_PURGE_BATCH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self.purge_interval = purge_interval
+        self.purge_batch = purge_batch
+        self._entries = OrderedDict()  # key -> (expires_at, content)
+        self._next_purge = 0.0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.purged = 0
+
+    @staticmethod
+    def make_key(payload: dict) -> str:
+        """Hash model, prompts and sampling params; whitespace differences are ignored"""
+        normalized = {
+            "model": payload["model"],
+            "messages": [
+                {"role": m["role"], "content": " ".join(m["content"].split())}
+                for m in payload["messages"]
+            ],
+            "temperature": payload.get("temperature"),
+            "top_p": payload.get("top_p"),
+            "max_tokens": payload.get("max_tokens"),
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+    def _put_local(self, key: str, content: str, expires_at: float):
+        self._entries[key] = (expires_at, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, content = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return content
+            del self._entries[key]
+
+        if self.persist:
+            row = await self._load(key)
+            if row is not None:
+                remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+                self._put_local(key, row.response, time.monotonic() + remaining)
+                self.hits += 1
+                self.persistent_hits += 1
+                return row.response
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, content: str):
+        self._put_local(key, content, time.monotonic() + self.ttl)
+        if self.persist:
+            await self._store(key, content)
+
+    async def _load(self, key: str):
+        # Imported lazily so AITutor stays usable without DATABASE_URL when persistence is off
+        from database import AsyncSessionLocal
+        from models import LLMCacheEntry
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(LLMCacheEntry).where(
+                        LLMCacheEntry.key == key,
+                        LLMCacheEntry.expires_at > datetime.utcnow()
+                    )
+                )
+                return result.scalar_one_or_none()
+        except Exception as e:
+            print(f"⚠️ LLM cache read failed: {e}")
+            return None
+
+    async def _store(self, key: str, content: str):
+        from database import AsyncSessionLocal
+        from models import LLMCacheEntry
+
+        now = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.merge(LLMCacheEntry(
+                    key=key,
+                    response=content,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl),
+                ))
+                await session.commit()
+        except Exception as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+            return
+
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            await self._purge(now)
+
+    async def _purge(self, now: datetime):
+        """Delete up to purge_batch expired rows; only writes grow the table, so they keep it trimmed"""
+        from database import AsyncSessionLocal
+        from models import LLMCacheEntry
+
+        expired = select(LLMCacheEntry.key).where(LLMCacheEntry.expires_at <= now).limit(self.purge_batch)
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(expired)))
+                await session.commit()
+            self.purged += result.rowcount
+            if result.rowcount >= self.purge_batch:
+                # A backlog is left: keep sweeping on the next writes rather than waiting a full interval
+                self._next_purge = 0.0
+        except Exception as e:
+            print(f"⚠️ LLM cache purge failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "purged": self.purged,
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent identical LLM calls onto one in-flight upstream request"""
+
+    def __init__(self):
+        self._calls = {}  # (loop, key) -> [task, waiter_count]
+        self.coalesced = 0
+
+    async def do(self, key: str, fn):
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._calls.get(call_key)
+        if call is None:
+            call = [loop.create_task(fn()), 0]
+            self._calls[call_key] = call
+            call[0].add_done_callback(lambda _: self._forget(call_key, call))
+        else:
+            self.coalesced += 1
+
+        task = call[0]
+        call[1] += 1
+        try:
+            # Shielded so one caller disconnecting does not cancel the others' result;
+            # upstream errors propagate to every waiter.
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not task.done():
+                # Last waiter gave up: abandon the upstream call and let new callers start fresh
+                self._forget(call_key, call)
+                task.cancel()
+
+    def _forget(self, call_key, call):
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
+
+
+class LLMUnavailable(Exception):
+    """An LLM call was refused locally or rate limited upstream; maps to an HTTP error"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMOverloaded(LLMUnavailable):
+    """The scheduler queue is full or the wait for a slot timed out"""
+
+
+class LLMRateLimited(LLMUnavailable):
+    """Groq kept answering 429 after we waited out its retry-after"""
+
+    status_code = 429
+
+
+class LLMTimeout(LLMUnavailable):
+    """Groq did not answer within GROQ_TOTAL_TIMEOUT, retries included"""
+
+    status_code = 504
+
+
+class LLMUpstreamError(LLMUnavailable):
+    """Groq failed or rejected the request and retrying did not help"""
+
+    status_code = 502
+
+
+class LLMCircuitOpen(LLMUnavailable):
+    """Groq has been failing recently; calls fail fast until the breaker cools down"""
+
+
+def _retry_after(response: httpx.Response) -> float:
+    """Seconds from a retry-after header (delta-seconds or HTTP date), default 1"""
+    value = response.headers.get("retry-after")
+    if not value:
+        return 1.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter keeps retries from many workers from arriving in lockstep
+    return random.uniform(0, min(GROQ_RETRY_MAX_DELAY, GROQ_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def estimate_request_tokens(payload: dict) -> int:
+    """Rough quota cost of a completion: prompt chars / 4 plus the max_tokens ceiling"""
+    chars = sum(len(m["content"]) for m in payload["messages"])
+    return chars // 4 + payload.get("max_tokens", 0)
+
+
+class TokenBucket:
+    """Continuously refilling budget for a per-minute quota; 0 disables it"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # a request larger than the quota still runs eventually
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Return (positive) or charge (negative) budget once the real cost is known"""
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class ModelQuota:
+    """One model's Groq limits: RPM and TPM buckets plus any retry-after pause"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0  # set from upstream retry-after
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        return max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def take(self, tokens: int, now: float):
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+
+
+class LLMScheduler:
+    """Priority queue in front of Groq: bounded concurrency, per-model RPM/TPM token buckets, retry-after"""
+
+    def __init__(self, max_concurrency: int = GROQ_MAX_CONCURRENCY, quotas: dict = None,
+                 max_queue: int = LLM_QUEUE_MAX, queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency or math.inf
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.quota_config = quotas if quotas is not None else GROQ_MODEL_QUOTAS
+        self._quotas = {}  # model -> ModelQuota, created on first use
+        self._queue = []  # heap of [rank, seq, future, tokens, enqueued_at, priority, model]
+        self._seq = itertools.count()
+        self._active = 0
+        self._timer = None
+        self._timer_loop = None
+        self.waits = {p: [0, 0.0, 0.0] for p in LLM_PRIORITIES}  # priority -> [count, total, max]
+        self.rejected = {p: 0 for p in LLM_PRIORITIES}
+        self.rate_limited = 0
+
+    def quota(self, model: str) -> ModelQuota:
+        if model not in self._quotas:
+            config = self.quota_config.get(model) or self.quota_config.get(AI_MODEL) or {}
+            self._quotas[model] = ModelQuota(config.get("requests_per_minute", 0), config.get("tokens_per_minute", 0))
+        return self._quotas[model]
+
+    def _retry_hint(self) -> float:
+        blocked_until = max((q.blocked_until for q in self._quotas.values()), default=0.0)
+        return max(1.0, math.ceil(blocked_until - time.monotonic()))
+
+    def admit(self, priority: str):
+        """Raise LLMOverloaded now if a call at this priority would be rejected (for streams)"""
+        if len(self._queue) >= self.max_queue and (not self._queue or max(self._queue)[0] <= LLM_PRIORITIES[priority]):
+            self.rejected[priority] += 1
+            raise LLMOverloaded("The AI tutor is busy right now. Please try again shortly.", self._retry_hint())
+
+    async def acquire(self, priority: str, tokens: int, model: str = AI_MODEL):
+        rank = LLM_PRIORITIES[priority]
+        self.admit(priority)
+        if len(self._queue) >= self.max_queue:
+            # Full, but this call outranks the newest lowest-priority waiter: shed that one
+            victim = max(self._queue)
+            self._queue.remove(victim)
+            heapq.heapify(self._queue)
+            self.rejected[victim[5]] += 1
+            victim[2].set_exception(
+                LLMOverloaded("The AI tutor is busy right now. Please try again shortly.", self._retry_hint())
+            )
+
+        entry = [rank, next(self._seq), asyncio.get_running_loop().create_future(), tokens, time.monotonic(), priority, model]
+        heapq.heappush(self._queue, entry)
+        self._dispatch()
+
+        timeout = None if priority == "background" else self.queue_timeout
+        try:
+            await asyncio.wait_for(entry[2], timeout)
+        except asyncio.TimeoutError:
+            self._abandon(entry)
+            self.rejected[priority] += 1
+            raise LLMOverloaded("The AI tutor is busy right now. Please try again shortly.", self._retry_hint())
+        except asyncio.CancelledError:
+            self._abandon(entry)
+            raise
+        finally:
+            waited = time.monotonic() - entry[4]
+            LLM_QUEUE_WAIT.labels(priority).observe(waited)
+            add_stage_time("llm_queue", waited)
+
+    def try_acquire(self, priority: str, tokens: int, model: str = AI_MODEL) -> bool:
+        """Take a slot only if one is free right now; hedged requests never queue"""
+        now = time.monotonic()
+        quota = self.quota(model)
+        if self._queue or self._active >= self.max_concurrency or quota.wait_time(tokens, now) > 0:
+            return False
+        quota.take(tokens, now)
+        self._active += 1
+        return True
+
+    def _abandon(self, entry: list):
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        elif entry[2].done() and not entry[2].cancelled() and entry[2].exception() is None:
+            self.release()  # the slot was granted as we gave up
+
+    def release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def settle(self, estimated: int, actual: int, model: str = AI_MODEL):
+        """Correct the model's token bucket with the usage Groq reported"""
+        self.quota(model).tokens.adjust(estimated - actual)
+
+    def pause(self, seconds: float, model: str = AI_MODEL):
+        """Hold dispatching for a model until an upstream retry-after has passed"""
+        quota = self.quota(model)
+        quota.blocked_until = max(quota.blocked_until, time.monotonic() + seconds)
+        self.rate_limited += 1
+
+    def _dispatch(self):
+        # Strict priority within each model: a model's first waiter holds back that model's
+        # later calls until its budget refills, but a call for a model with budget left goes ahead
+        now = time.monotonic()
+        waiting = set()  # models whose first queued call is waiting for budget
+        finished = set()
+        wake = None
+        for entry in sorted(self._queue):
+            if self._active >= self.max_concurrency:
+                break
+            if entry[2].done():
+                finished.add(id(entry))
+                continue
+            model = entry[6]
+            if model in waiting:
+                continue
+            quota = self.quota(model)
+            wait = quota.wait_time(entry[3], now)
+            if wait > 0:
+                waiting.add(model)
+                wake = wait if wake is None else min(wake, wait)
+                continue
+            finished.add(id(entry))
+            quota.take(entry[3], now)
+            self._active += 1
+            stats = self.waits[entry[5]]
+            waited = now - entry[4]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+            entry[2].set_result(None)
+        if finished:
+            self._queue = [entry for entry in self._queue if id(entry) not in finished]
+            heapq.heapify(self._queue)
+        if wake is not None:
+            self._wake_after(wake)
+
+    def _wake_after(self, seconds: float):
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and not self._timer.cancelled() and self._timer_loop is loop:
+            if self._timer.when() <= loop.time() + seconds:
+                return
+            self._timer.cancel()  # another model's budget frees up sooner
+        self._timer_loop = loop
+        self._timer = loop.call_later(seconds, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: str, tokens: int, model: str = AI_MODEL):
+        await self.acquire(priority, tokens, model)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        depth = {p: 0 for p in LLM_PRIORITIES}
+        for entry in self._queue:
+            depth[entry[5]] += 1
+        return {
+            "active": self._active,
+            "queued": depth,
+            "avg_wait_ms": {p: 1000 * w[1] / w[0] if w[0] else 0 for p, w in self.waits.items()},
+            "max_wait_ms": {p: 1000 * w[2] for p, w in self.waits.items()},
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "paused_for_s": {
+                model: max(0.0, quota.blocked_until - time.monotonic()) for model, quota in self._quotas.items()
+            },
+        }
+
+
+class LatencyTracker:
+    """Recent successful Groq latencies, used to pick the hedge delay"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float):
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Fails Groq calls fast while most recent calls failed, probing again after a cooldown"""
+
+    def __init__(self, window: int = GROQ_BREAKER_WINDOW, min_calls: int = GROQ_BREAKER_MIN_CALLS,
+                 threshold: float = GROQ_BREAKER_THRESHOLD, cooldown: float = GROQ_BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_started = None
+        self.trips = 0
+        self.short_circuited = 0
+
+    def check(self):
+        """Raise LLMCircuitOpen unless a call may go upstream now; returns a probe token for finish()"""
+        now = time.monotonic()
+        if self.state == "open":
+            remaining = self._opened_at + self.cooldown - now
+            if remaining > 0:
+                self.short_circuited += 1
+                raise LLMCircuitOpen("The AI service is temporarily unavailable. Please try again shortly.", remaining)
+            self.state = "half_open"
+            self._probe_started = None
+        if self.state == "half_open":
+            # One probe at a time; a probe that never reported back is replaced after the timeout
+            if self._probe_started is not None and now - self._probe_started < GROQ_TOTAL_TIMEOUT:
+                self.short_circuited += 1
+                raise LLMCircuitOpen("The AI service is temporarily unavailable. Please try again shortly.", 1.0)
+            self._probe_started = now
+            return now
+        return None
+
+    def finish(self, probe):
+        """Called when the call that check() let through ends, however it ends. A probe that
+        recorded no outcome (cancelled, or an error that says nothing about Groq's health)
+        frees the half-open slot so the next call can probe"""
+        if probe is not None and self.state == "half_open" and self._probe_started == probe:
+            self._probe_started = None
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self._probe_started = None
+            if ok:
+                self.state = "closed"
+                self._outcomes.clear()
+                print("✅ Groq circuit closed")
+            else:
+                self._trip()
+            return
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+            self._trip()
+
+    def _trip(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.trips += 1
+        print(f"⚠️ Groq circuit open for {self.cooldown:.0f}s")
+
+    def stats(self) -> dict:
+        return {"state": self.state, "trips": self.trips, "short_circuited": self.short_circuited}
 
 
 class AITutor:
@@ -17,43 +791,302 @@ class AITutor:
     def __init__(self):
         self.base_url = GROQ_BASE_URL
         self.api_key = GROQ_API_KEY
-        self.model = AI_MODEL
-    
-    def generate_response(self, prompt: str, system_prompt: str = None) -> str:
-        """Generate AI response using Groq API"""
-        
+        self._client = None
+        self._client_loop = None
+        self.cache = ResponseCache()
+        self.flight = SingleFlight()
+        self.scheduler = LLMScheduler()
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.escalations = 0
+
+    async def open(self):
+        """Bind the shared HTTP client to the server loop (called from the FastAPI lifespan)
+
+        The client itself is built on the first Groq call, so startup does not pay
+        for TLS context and HTTP/2 setup.
+        """
+        self._client_loop = asyncio.get_running_loop()
+
+    async def close(self):
+        """Close the shared HTTP client and drop its pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._client_loop = None
+
+    def _shared_client(self):
+        # The pooled client is bound to the loop that opened it; sync wrappers
+        # running under their own asyncio.run() get a short-lived client instead.
+        if self._client_loop is not asyncio.get_running_loop():
+            return None
+        if self._client is None:
+            self._client = _build_client()
+        return self._client
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    async def _post(self, client: httpx.AsyncClient, payload: dict) -> dict:
+        response = await client.post("/chat/completions", headers=self._headers(), json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def _payload(self, prompt: str, system_prompt: str = None, task: str = "generate_response", model: str = None) -> dict:
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
-        
+
+        route = MODEL_ROUTES.get(task, MODEL_ROUTES["generate_response"])
+        return {
+            "model": model or route["model"],
+            "messages": messages,
+            "temperature": route["temperature"],
+            "top_p": 0.95,
+            "max_tokens": route["max_tokens"]
+        }
+
+    async def _timed_post(self, client: httpx.AsyncClient, payload: dict) -> dict:
+        started = time.perf_counter()
+        data = await self._post(client, payload)
+        self.latency.observe(time.perf_counter() - started)
+        return data
+
+    async def _attempt(self, client: httpx.AsyncClient, payload: dict, priority: str, estimated: int, deadline: float) -> dict:
+        """One logical attempt, optionally hedged with a duplicate request after the p95 latency"""
+        primary = asyncio.ensure_future(self._timed_post(client, payload))
+        p95 = self.latency.quantile(0.95)
+        if not GROQ_HEDGE_REQUESTS or priority not in ("chat", "grading") or p95 is None:
+            return await asyncio.wait_for(primary, deadline - time.monotonic())
+
+        tasks = [primary]
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": 0.9,
-                    "top_p": 0.95,
-                    "max_tokens": 800
-                },
-                timeout=180
-            )
+            done, _ = await asyncio.wait(tasks, timeout=min(max(p95, GROQ_HEDGE_MIN_DELAY), deadline - time.monotonic()))
+            if not done and self.scheduler.try_acquire(priority, estimated, payload["model"]):
+                hedge = asyncio.ensure_future(self._timed_post(client, payload))
+                hedge.add_done_callback(lambda _: self.scheduler.release())
+                tasks.append(hedge)
+                self.hedges += 1
+
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline - time.monotonic(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _call(self, client: httpx.AsyncClient, payload: dict, priority: str, method: str) -> dict:
+        started = time.perf_counter()
+        try:
+            data = await self._call_with_retries(client, payload, priority)
+        except LLMUnavailable as e:
+            LLM_LATENCY.labels(method, e.__class__.__name__).observe(time.perf_counter() - started)
+            raise
+        LLM_LATENCY.labels(method, "ok").observe(time.perf_counter() - started)
+        record_usage(method, data.get("usage"))
+        return data
+
+    async def _call_with_retries(self, client: httpx.AsyncClient, payload: dict, priority: str) -> dict:
+        """POST a completion with retries, backoff, hedging and the circuit breaker"""
+        estimated = estimate_request_tokens(payload)
+        deadline = time.monotonic() + GROQ_TOTAL_TIMEOUT
+        attempt = 0
+        while True:
+            probe = self.breaker.check()
+            delay = None  # None: the scheduler already waits out the retry-after
+            try:
+                async with self.scheduler.slot(priority, estimated, payload["model"]):
+                    upstream_started = time.perf_counter()
+                    try:
+                        data = await self._attempt(client, payload, priority, estimated, deadline)
+                    finally:
+                        add_stage_time("llm", time.perf_counter() - upstream_started)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status in (429, 503):
+                    # Stop this model's calls until Groq's retry-after, then requeue this call
+                    retry_after = _retry_after(e.response)
+                    self.scheduler.pause(retry_after, payload["model"])
+                    if status == 429:
+                        error = LLMRateLimited("The AI tutor is rate limited. Please try again shortly.", retry_after)
+                    else:
+                        self.breaker.record(False)
+                        error = LLMOverloaded("The AI service is over capacity. Please try again shortly.", retry_after)
+                elif status >= 500 or status == 408:
+                    self.breaker.record(False)
+                    delay = _backoff(attempt)
+                    error = LLMUpstreamError(f"The AI service returned an error ({status}). Please try again.")
+                else:
+                    raise LLMUpstreamError(f"The AI service rejected the request ({status}).") from e
+            except (httpx.TimeoutException, asyncio.TimeoutError):
+                self.breaker.record(False)
+                delay = _backoff(attempt)
+                error = LLMTimeout("The AI is taking too long to respond. Please try a simpler question.")
+            except httpx.TransportError as e:
+                self.breaker.record(False)
+                delay = _backoff(attempt)
+                error = LLMUpstreamError(f"Could not reach the AI service: {e.__class__.__name__}")
+            else:
+                self.breaker.record(True)
+                usage = data.get("usage") or {}
+                if usage.get("total_tokens"):
+                    self.scheduler.settle(estimated, usage["total_tokens"], payload["model"])
+                return data
+            finally:
+                self.breaker.finish(probe)
+
+            attempt += 1
+            if attempt > GROQ_MAX_RETRIES or time.monotonic() + (delay or 0) >= deadline:
+                raise error
+            self.retries += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def _complete(self, payload: dict, priority: str = "chat", method: str = "generate_response") -> str:
+        """Return the completion text; raises an LLMUnavailable subclass on failure"""
+        client = self._shared_client()
+        if client is not None:
+            data = await self._call(client, payload, priority, method)
+        else:
+            async with _build_client() as client:
+                data = await self._call(client, payload, priority, method)
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMUpstreamError("The AI service returned a malformed response.")
+
+    async def _fetch(self, payload: dict, key: str, cache: bool, priority: str, method: str) -> str:
+        content = await self._complete(payload, priority, method)
+        # Only successful completions are cached, never error strings
+        if cache:
+            await self.cache.set(key, content)
+        return content
+
+    async def generate_response_async(self, prompt: str, system_prompt: str = None, cache: bool = False, coalesce: bool = False, priority: str = "chat", method: str = "generate_response", model: str = None) -> str:
+        """Generate AI response using Groq API; raises LLMUnavailable subclasses on failure
+
+        Model, max_tokens and temperature come from MODEL_ROUTES[method] unless model is given.
+        """
+
+        payload = self._payload(prompt, system_prompt, method, model)
+
+        key = self.cache.make_key(payload) if cache or coalesce else None
+        if cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        # Failures raise LLMUnavailable subclasses (mapped to HTTP errors in main.py), so
+        # error text is never stored as a tutor reply or parsed as a grade
+        if coalesce:
+            return await self.flight.do(key, lambda: self._fetch(payload, key, cache, priority, method))
+        return await self._fetch(payload, key, cache, priority, method)
+
+    async def _stream_chunks(self, client: httpx.AsyncClient, payload: dict, method: str):
+        async with client.stream("POST", "/chat/completions", headers=self._headers(), json=payload) as response:
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except requests.exceptions.Timeout:
-            return "The AI is taking too long to respond. Please try a simpler question."
-        except Exception as e:
-            return f"Error communicating with AI: {str(e)}"
-    
-    def tutor_chat(self, student_question: str, topic: str = None, conversation_history: list = None) -> str:
-        """Respond to student questions using Socratic method"""
-        
+            async for line in response.aiter_lines():
+                # OpenAI-compatible SSE: "data: {...}" lines, terminated by "data: [DONE]"
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                # Groq reports usage on the last chunk under x_groq; OpenAI under usage
+                record_usage(method, event.get("usage") or (event.get("x_groq") or {}).get("usage"))
+                choices = event.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    async def stream_response_async(self, prompt: str, system_prompt: str = None, priority: str = "chat", method: str = "stream_response"):
+        """Stream an AI response from Groq as text chunks (stream: true)"""
+
+        payload = self._payload(prompt, system_prompt, method)
+        payload["stream"] = True
+
+        started = time.perf_counter()
+        try:
+            async for chunk in self._stream_upstream(payload, priority, method):
+                yield chunk
+        except LLMUnavailable as e:
+            LLM_LATENCY.labels(method, e.__class__.__name__).observe(time.perf_counter() - started)
+            raise
+        LLM_LATENCY.labels(method, "ok").observe(time.perf_counter() - started)
+
+    async def _stream_upstream(self, payload: dict, priority: str, method: str):
+        # No retries once streaming: the client may already have shown part of the reply
+        probe = self.breaker.check()
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                await stack.enter_async_context(self.scheduler.slot(priority, estimate_request_tokens(payload), payload["model"]))
+                upstream_started = time.perf_counter()
+                stack.callback(lambda: add_stage_time("llm", time.perf_counter() - upstream_started))
+                deadline = asyncio.get_running_loop().time() + GROQ_TOTAL_TIMEOUT
+                client = self._shared_client()
+                if client is None:
+                    client = await stack.enter_async_context(_build_client())
+                async for chunk in self._stream_chunks(client, payload, method):
+                    yield chunk
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise asyncio.TimeoutError()
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if status in (429, 503):
+                retry_after = _retry_after(e.response)
+                self.scheduler.pause(retry_after, payload["model"])
+                if status == 429:
+                    raise LLMRateLimited("The AI tutor is rate limited. Please try again shortly.", retry_after)
+                self.breaker.record(False)
+                raise LLMOverloaded("The AI service is over capacity. Please try again shortly.", retry_after)
+            if status >= 500:
+                self.breaker.record(False)
+            raise LLMUpstreamError(f"The AI service returned an error ({status}). Please try again.") from e
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            self.breaker.record(False)
+            raise LLMTimeout("The AI is taking too long to respond. Please try a simpler question.")
+        except (httpx.TransportError, json.JSONDecodeError, KeyError, IndexError) as e:
+            self.breaker.record(False)
+            raise LLMUpstreamError(f"Could not read the AI response: {e.__class__.__name__}")
+        else:
+            self.breaker.record(True)
+        finally:
+            # Also runs when the client disconnects and the generator is closed mid-stream
+            self.breaker.finish(probe)
+
+    async def _generate_parsed(self, prompt: str, system_prompt: str, parse, cache: bool, coalesce: bool, priority: str, method: str):
+        """Run a task on its routed model and parse the reply; malformed replies from a
+        smaller model are retried once on AI_MODEL"""
+        response = await self.generate_response_async(prompt, system_prompt, cache=cache, coalesce=coalesce, priority=priority, method=method)
+        result, well_formed = parse(response)
+        if not well_formed and MODEL_ROUTES.get(method, {}).get("model", AI_MODEL) != AI_MODEL:
+            self.escalations += 1
+            response = await self.generate_response_async(prompt, system_prompt, cache=cache, coalesce=coalesce, priority=priority, method=method, model=AI_MODEL)
+            result, _ = parse(response)
+        return result
+
+    def _chat_prompts(self, student_question: str, topic: str = None, conversation_history: list = None, summary: str = None) -> tuple:
+        """Build the (prompt, system_prompt) pair for a tutor chat turn"""
+
         system_prompt = """You are an expert tutor. Your goal is to help students learn by:
 1. Not giving direct answers immediately
 2. Asking guiding questions to help them think
@@ -67,30 +1100,78 @@ Use the Socratic method to guide learning."""
         context = ""
         if topic:
             context = f"\n\nCurrent topic: {topic}"
-        
+
+        if summary:
+            context += f"\n\nSummary of earlier conversation:\n{summary}"
+
+        # History arrives already trimmed to the memory token budget (see conversation_memory)
         if conversation_history:
-            history = "\n".join([f"Student: {h['question']}\nTutor: {h['answer']}" 
-                                for h in conversation_history[-3:]])
+            history = "\n".join([f"Student: {h['question']}\nTutor: {h['answer']}"
+                                for h in conversation_history])
             context += f"\n\nRecent conversation:\n{history}"
-        
+
         prompt = f"{context}\n\nStudent's question: {student_question}\n\nYour response:"
-        
-        return self.generate_response(prompt, system_prompt)
-    
-    def generate_practice_problem(self, topic: str, difficulty: float = 5.0, problem_type: str = "open_ended") -> dict:
-        """Generate a practice problem for a given topic"""
-        
-        difficulty_map = {
-            (0, 3): "easy",
-            (3, 7): "medium", 
-            (7, 11): "hard"
-        }
-        
-        # Clamp difficulty to valid range so the map lookup never raises StopIteration
-        difficulty = max(0.0, min(difficulty, 10.9))
-        difficulty_level = next(level for (low, high), level in difficulty_map.items() 
-                               if low <= difficulty < high)
-        
+
+        return prompt, system_prompt
+
+    async def tutor_chat_async(self, student_question: str, topic: str = None, conversation_history: list = None, summary: str = None) -> str:
+        """Respond to student questions using Socratic method"""
+        # Without personal context the reply depends only on topic and question, so
+        # repeated questions can reuse an earlier answer
+        first_turn = not conversation_history and not summary
+        if first_turn:
+            indexed = answer_index.lookup(topic, student_question)
+            if indexed is not None:
+                return indexed
+
+        prompt, system_prompt = self._chat_prompts(student_question, topic, conversation_history, summary)
+        response = await self.generate_response_async(prompt, system_prompt, method="tutor_chat")
+        if first_turn:
+            answer_index.add(topic, student_question, response)
+        return response
+
+    async def tutor_chat_stream(self, student_question: str, topic: str = None, conversation_history: list = None, summary: str = None):
+        """Stream a Socratic tutor response as text chunks"""
+        first_turn = not conversation_history and not summary
+        if first_turn:
+            indexed = answer_index.lookup(topic, student_question)
+            if indexed is not None:
+                yield indexed
+                return
+
+        prompt, system_prompt = self._chat_prompts(student_question, topic, conversation_history, summary)
+        chunks = []
+        async for chunk in self.stream_response_async(prompt, system_prompt, method="tutor_chat_stream"):
+            chunks.append(chunk)
+            yield chunk
+        if first_turn:
+            answer_index.add(topic, student_question, "".join(chunks))
+
+    async def summarize_conversation_async(self, previous_summary: str, turns: list, max_words: int = 150) -> str:
+        """Fold older tutoring turns into a rolling summary; raises on upstream errors"""
+
+        system_prompt = f"""You summarize tutoring sessions so the tutor can continue them later.
+Keep what the student is working on, what they understood, where they struggled and any open questions.
+Write at most {max_words} words of plain prose."""
+
+        transcript = "\n".join([f"Student: {t['question']}\nTutor: {t['answer']}" for t in turns])
+        prompt = f"""Summary so far:
+{previous_summary or '(none)'}
+
+New conversation turns:
+{transcript}
+
+Updated summary:"""
+
+        # Goes straight to _complete so failures raise instead of becoming summary text
+        payload = self._payload(prompt, system_prompt, "summarize_conversation")
+        return (await self._complete(payload, priority="background", method="summarize_conversation")).strip()
+
+    def _problem_prompts(self, topic: str, difficulty: float, problem_type: str) -> tuple:
+        """Build the (prompt, system_prompt) pair for a practice problem"""
+
+        difficulty_level = difficulty_bucket(difficulty)
+
         system_prompt = f"""You are a problem generator. Create a {difficulty_level} difficulty practice problem about {topic}.
 
 Format your response EXACTLY as follows:
@@ -99,32 +1180,29 @@ SOLUTION: [Step-by-step solution]
 HINTS: [2-3 helpful hints, separated by semicolons]"""
 
         prompt = f"Generate a {problem_type} problem about {topic} at {difficulty_level} difficulty level."
-        
-        response = self.generate_response(prompt, system_prompt)
-        
-        try:
-            parts = response.split("SOLUTION:")
-            question = parts[0].replace("QUESTION:", "").strip()
-            
-            solution_and_hints = parts[1].split("HINTS:")
-            solution = solution_and_hints[0].strip()
-            hints = solution_and_hints[1].strip() if len(solution_and_hints) > 1 else ""
-            
-            return {
-                "question": question,
-                "solution": solution,
-                "hints": hints.split(";") if hints else []
-            }
-        except:
-            return {
-                "question": response,
-                "solution": "Solution generation failed",
-                "hints": []
-            }
-    
-    def assess_answer(self, question: str, student_answer: str, correct_solution: str) -> dict:
+
+        return prompt, system_prompt
+
+    async def generate_practice_problem_async(self, topic: str, difficulty: float = 5.0, problem_type: str = "open_ended", cache: bool = True, coalesce: bool = True, priority: str = "generation") -> dict:
+        """Generate a practice problem for a given topic"""
+
+        prompt, system_prompt = self._problem_prompts(topic, difficulty, problem_type)
+        return await self._generate_parsed(prompt, system_prompt, parse_problem, cache, coalesce, priority, "generate_practice_problem")
+
+    async def generate_practice_problem_stream(self, topic: str, difficulty: float = 5.0, problem_type: str = "open_ended", priority: str = "generation"):
+        """Stream a practice problem as (section, value) pairs, yielding the question as soon as SOLUTION: appears"""
+
+        prompt, system_prompt = self._problem_prompts(topic, difficulty, problem_type)
+        parser = ProblemStreamParser()
+        async for chunk in self.stream_response_async(prompt, system_prompt, priority=priority, method="generate_practice_problem_stream"):
+            for section in parser.feed(chunk):
+                yield section
+        for section in parser.close():
+            yield section
+
+    async def assess_answer_async(self, question: str, student_answer: str, correct_solution: str, cache: bool = False, coalesce: bool = True) -> dict:
         """Assess a student's answer and provide feedback"""
-        
+
         system_prompt = """You are an expert grader. Evaluate the student's answer and provide constructive feedback.
 
 Format your response EXACTLY as:
@@ -140,40 +1218,11 @@ Student's Answer: {student_answer}
 
 Evaluate the student's answer."""
 
-        response = self.generate_response(prompt, system_prompt)
-        
-        try:
-            lines = response.split("\n")
-
-            correct_line = next((l for l in lines if l.strip().startswith("CORRECT:")), None)
-            is_correct = correct_line is not None and "Yes" in correct_line
-
-            score_line = next((l for l in lines if l.strip().startswith("SCORE:")), None)
-            if score_line:
-                raw_score = score_line.split(":", 1)[1].strip().split("/")[0].strip()
-                score = int(float(raw_score))
-            else:
-                score = 100 if is_correct else 0
+        return await self._generate_parsed(prompt, system_prompt, parse_assessment, cache, coalesce, "grading", "assess_answer")
 
-            feedback_parts = response.split("FEEDBACK:")
-            feedback = feedback_parts[1].strip() if len(feedback_parts) > 1 else response.strip()
-
-            return {
-                "is_correct": is_correct,
-                "score": score,
-                "feedback": feedback
-            }
-        except Exception as e:
-            # Fallback: still return useful feedback even if parsing fails
-            return {
-                "is_correct": False,
-                "score": 0,
-                "feedback": response
-            }
-    
-    def generate_learning_path(self, subject: str, current_level: str = "beginner", goals: str = "") -> list:
+    async def generate_learning_path_async(self, subject: str, current_level: str = "beginner", goals: str = "", cache: bool = True, coalesce: bool = True) -> list:
         """Generate a personalized learning path"""
-        
+
         system_prompt = """You are a curriculum designer. Create a logical learning path.
 
 Format your response as a numbered list of topics in learning order."""
@@ -184,17 +1233,24 @@ Goals: {goals if goals else 'General mastery'}
 
 List the topics in order from foundational to advanced."""
 
-        response = self.generate_response(prompt, system_prompt)
-        
-        topics = []
-        for line in response.split("\n"):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith("-")):
-                topic = line.lstrip("0123456789.-) ").strip()
-                if topic:
-                    topics.append(topic)
-        
-        return topics
+        return await self._generate_parsed(prompt, system_prompt, parse_learning_path, cache, coalesce, "generation", "generate_learning_path")
+
+    # Sync wrappers for scripts and other non-async callers
+
+    def generate_response(self, prompt: str, system_prompt: str = None, cache: bool = False) -> str:
+        return asyncio.run(self.generate_response_async(prompt, system_prompt, cache))
+
+    def tutor_chat(self, student_question: str, topic: str = None, conversation_history: list = None, summary: str = None) -> str:
+        return asyncio.run(self.tutor_chat_async(student_question, topic, conversation_history, summary))
+
+    def generate_practice_problem(self, topic: str, difficulty: float = 5.0, problem_type: str = "open_ended", cache: bool = True) -> dict:
+        return asyncio.run(self.generate_practice_problem_async(topic, difficulty, problem_type, cache))
+
+    def assess_answer(self, question: str, student_answer: str, correct_solution: str, cache: bool = False) -> dict:
+        return asyncio.run(self.assess_answer_async(question, student_answer, correct_solution, cache))
+
+    def generate_learning_path(self, subject: str, current_level: str = "beginner", goals: str = "", cache: bool = True) -> list:
+        return asyncio.run(self.generate_learning_path_async(subject, current_level, goals, cache))
 
 
-ai_tutor = AITutor()
\ No newline at end of file
+ai_tutor = AITutor()
@@ -0,0 +1,168 @@
+import hashlib
+import itertools
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from metrics import ANSWER_INDEX_LOOKUP
+
+ANSWER_INDEX_ENABLED = os.getenv("ANSWER_INDEX_ENABLED", "True") == "True"
+# Serve a stored answer when its question is at least this similar (Jaccard over character 3-grams)
+ANSWER_INDEX_THRESHOLD = float(os.getenv("ANSWER_INDEX_THRESHOLD", "0.85"))
+# Answers kept per topic; the oldest are evicted first
+ANSWER_INDEX_MAX_PER_TOPIC = int(os.getenv("ANSWER_INDEX_MAX_PER_TOPIC", "2000"))
+# Shorter messages ("ok", "why?") depend on context and are never served from the index
+ANSWER_INDEX_MIN_CHARS = int(os.getenv("ANSWER_INDEX_MIN_CHARS", "12"))
+
+# MinHash signature of BANDS * ROWS values; questions sharing one band of ROWS values become
+# candidates, which catches pairs above roughly (1 / BANDS) ** (1 / ROWS) = 0.5 similarity
+LSH_BANDS = 16
+LSH_ROWS = 4
+
+# XOR masks stand in for random permutations: cheap in pure Python, and good enough to pick
+# candidates because every candidate is then checked with an exact Jaccard score
+_rng = random.Random(20240601)  # fixed seed: signatures must not change between restarts
+_MASKS = [_rng.getrandbits(32) for _ in range(LSH_BANDS * LSH_ROWS)]
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase and collapse punctuation and whitespace; math operators are kept"""
+    return " ".join(re.sub(r"[^\w+\-*/=^<>]", " ", text.lower()).split())
+
+
+def shingles(text: str) -> frozenset:
+    """Character 3-grams of a normalized question, hashed to 32-bit ints"""
+    grams = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+    return frozenset(int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "big") for g in grams)
+
+
+def minhash(shingle_set: frozenset) -> list:
+    return [min(x ^ mask for x in shingle_set) for mask in _MASKS]
+
+
+def _band_keys(signature: list) -> list:
+    return [(band, tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])) for band in range(LSH_BANDS)]
+
+
+class _Entry:
+    __slots__ = ("shingles", "numbers", "bands", "response")
+
+    def __init__(self, shingles: frozenset, numbers: tuple, bands: list, response: str):
+        self.shingles = shingles
+        self.numbers = numbers
+        self.bands = bands
+        self.response = response
+
+
+class _TopicIndex:
+    def __init__(self):
+        self.entries = OrderedDict()  # entry id -> _Entry, oldest first
+        self.buckets = {}  # (band, row values) -> set of entry ids
+
+
+class AnswerIndex:
+    """MinHash/LSH index of first-turn tutor answers per topic, for repeated questions"""
+
+    def __init__(self, enabled: bool = ANSWER_INDEX_ENABLED, threshold: float = ANSWER_INDEX_THRESHOLD,
+                 max_per_topic: int = ANSWER_INDEX_MAX_PER_TOPIC, min_chars: int = ANSWER_INDEX_MIN_CHARS):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_per_topic = max_per_topic
+        self.min_chars = min_chars
+        self._topics = {}  # normalized topic -> _TopicIndex
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    def _features(self, question: str):
+        text = normalize_question(question)
+        if len(text) < self.min_chars:
+            return None
+        return shingles(text), tuple(sorted(_NUMBER.findall(text)))
+
+    def _best_match(self, index: _TopicIndex, features: tuple, bands: list) -> tuple:
+        question_shingles, numbers = features
+        candidates = set()
+        for key in bands:
+            candidates.update(index.buckets.get(key, ()))
+        best, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = index.entries[entry_id]
+            # "2 + 3" and "2 + 4" differ in one shingle but need different answers
+            if entry.numbers != numbers:
+                continue
+            score = len(question_shingles & entry.shingles) / len(question_shingles | entry.shingles)
+            if score > best_score:
+                best, best_score = entry, score
+        return best, best_score
+
+    def lookup(self, topic: str, question: str):
+        """Return a stored answer to a near-duplicate question on the topic, or None"""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        response = None
+        features = self._features(question)
+        index = self._topics.get((topic or "").strip().lower())
+        if features is not None and index is not None:
+            entry, score = self._best_match(index, features, _band_keys(minhash(features[0])))
+            if entry is not None and score >= self.threshold:
+                response = entry.response
+
+        elapsed = time.perf_counter() - started
+        self.lookup_seconds += elapsed
+        ANSWER_INDEX_LOOKUP.observe(elapsed)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def add(self, topic: str, question: str, response: str):
+        """Index an answer given without conversation context"""
+        if not self.enabled or not response:
+            return
+        features = self._features(question)
+        if features is None:
+            return
+        index = self._topics.setdefault((topic or "").strip().lower(), _TopicIndex())
+        bands = _band_keys(minhash(features[0]))
+        _, score = self._best_match(index, features, bands)
+        if score >= self.threshold:
+            return  # an equivalent question is already indexed
+
+        entry_id = next(self._ids)
+        index.entries[entry_id] = _Entry(features[0], features[1], bands, response)
+        for key in bands:
+            index.buckets.setdefault(key, set()).add(entry_id)
+        while len(index.entries) > self.max_per_topic:
+            old_id, old = index.entries.popitem(last=False)
+            for key in old.bands:
+                bucket = index.buckets[key]
+                bucket.discard(old_id)
+                if not bucket:
+                    del index.buckets[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "topics": len(self._topics),
+            "entries": sum(len(index.entries) for index in self._topics.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_lookup_ms": 1000 * self.lookup_seconds / lookups if lookups else 0.0,
+        }
+
+
+answer_index = AnswerIndex()
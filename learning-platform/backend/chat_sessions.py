@@ -0,0 +1,85 @@
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from database import AsyncSessionLocal
+from conversation_memory import conversation_memory, MEMORY_COMPACT_AFTER
+
+# Tutor sessions kept in memory for WebSocket clients, least recently active evicted first
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "5000"))
+# Seconds without a message before a session's state is dropped (it reloads from the DB on return)
+CHAT_SESSION_IDLE_TTL = float(os.getenv("CHAT_SESSION_IDLE_TTL", "900"))
+
+
+class ChatSession:
+    """One user's tutoring context between WebSocket messages"""
+
+    def __init__(self, user_id: int, summary: str, history: list, topic: str = None):
+        self.user_id = user_id
+        self.summary = summary
+        self.history = history  # oldest first, within the memory token budget
+        self.topic = topic
+        self.turns_since_load = 0
+        self.last_active = time.monotonic()
+
+    def record(self, question: str, answer: str):
+        turns = [{"question": question, "answer": answer}] + self.history[::-1]
+        self.history = conversation_memory.fit(self.summary, turns)
+        self.turns_since_load += 1
+
+
+class ChatSessionStore:
+    """In-memory tutor sessions, so active WebSocket chats skip the per-message history queries"""
+
+    def __init__(self, max_sessions: int = CHAT_SESSION_MAX, idle_ttl: float = CHAT_SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()  # user_id -> ChatSession, least recently active first
+        self.connections = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_active < self.idle_ttl:
+                break
+            del self._sessions[user_id]
+            self.evictions += 1
+
+    async def get(self, user_id: int) -> ChatSession:
+        """The user's session, loading summary and recent turns from the database when needed"""
+        self._evict()
+        session = self._sessions.get(user_id)
+        # After a compaction's worth of turns, reload so the new summary replaces dropped turns
+        if session is not None and session.turns_since_load < MEMORY_COMPACT_AFTER:
+            self.hits += 1
+        else:
+            async with AsyncSessionLocal() as db:
+                summary, history = await conversation_memory.load(db, user_id)
+            session = ChatSession(user_id, summary, history, session.topic if session else None)
+            self._sessions[user_id] = session
+            self.loads += 1
+
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(user_id)
+        self._evict()
+        return session
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+chat_sessions = ChatSessionStore()
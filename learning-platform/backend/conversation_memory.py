@@ -0,0 +1,207 @@
+import asyncio
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from database import AsyncSessionLocal
+from models import Conversation, ConversationSummary
+from ai_tutor import ai_tutor
+from conversation_writer import conversation_writer
+
+# Token budget for summary + verbatim recent turns in each chat prompt
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+# Most recent turns always kept verbatim (never folded into the summary)
+MEMORY_KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "3"))
+# Compact once this many turns are unsummarized, so we do not summarize on every message
+MEMORY_COMPACT_AFTER = int(os.getenv("MEMORY_COMPACT_AFTER", "6"))
+MEMORY_SUMMARY_MAX_WORDS = int(os.getenv("MEMORY_SUMMARY_MAX_WORDS", "150"))
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate; exact with tiktoken installed, otherwise a word-piece heuristic"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Llama-style tokenizers split long words; ~1.3 tokens per word/punctuation piece
+    return int(len(_TOKEN_PIECES.findall(text)) * 1.3) + 1
+
+
+def _turn_tokens(turn: dict) -> int:
+    return estimate_tokens(turn["question"]) + estimate_tokens(turn["answer"]) + 4
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    words = text.split()
+    keep = len(words)
+    while keep and estimate_tokens(" ".join(words[:keep])) > max_tokens:
+        keep = int(keep * 0.8)
+    return " ".join(words[:keep]) + " …" if keep < len(words) else text
+
+
+class ConversationMemory:
+    """Per-user rolling summary plus recent turns, bounded by a token budget"""
+
+    def __init__(self, token_budget: int = MEMORY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._compacting = set()  # user ids with a compaction in progress
+        self._tasks = set()
+        self.prompts = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.compactions = 0
+        self.compaction_seconds_total = 0.0
+        self.compaction_failures = 0
+
+    async def load(self, db: AsyncSession, user_id: int) -> tuple:
+        """Return (summary, history) for the next prompt, within the token budget"""
+        summary_row = await db.get(ConversationSummary, user_id)
+        summary = summary_row.summary if summary_row else ""
+        through_id = summary_row.summarized_through_id if summary_row else 0
+
+        result = await db.execute(
+            select(Conversation)
+            .where(Conversation.user_id == user_id, Conversation.id > through_id)
+            .order_by(Conversation.timestamp.desc(), Conversation.id.desc())
+            .limit(MEMORY_COMPACT_AFTER + MEMORY_KEEP_TURNS)
+        )
+        rows = result.scalars().all()
+        # Turns still in the write-behind queue are newer than anything in the table
+        written = {conv.public_id for conv in rows}
+        recent = [
+            {"question": row["message"], "answer": row["response"]}
+            for row in conversation_writer.pending_turns(user_id)
+            if row["public_id"] not in written
+        ][:MEMORY_COMPACT_AFTER + MEMORY_KEEP_TURNS]
+        recent += [
+            {"question": conv.message, "answer": conv.response}
+            for conv in rows
+        ]
+
+        history = self.fit(summary, recent)
+
+        tokens = estimate_tokens(summary) + sum(_turn_tokens(t) for t in history)
+        self.prompts += 1
+        self.prompt_tokens_total += tokens
+        self.prompt_tokens_max = max(self.prompt_tokens_max, tokens)
+        return summary, history
+
+    def fit(self, summary: str, recent: list) -> list:
+        """Trim turns (newest first) to the token budget left by the summary; returns them oldest first"""
+        # Newest turns first until the budget runs out; the newest is truncated rather than dropped
+        budget = self.token_budget - estimate_tokens(summary)
+        history = []
+        for turn in recent:
+            tokens = _turn_tokens(turn)
+            if tokens > budget:
+                if not history and budget > 0:
+                    history.append({
+                        "question": _truncate(turn["question"], budget // 2),
+                        "answer": _truncate(turn["answer"], budget // 2),
+                    })
+                break
+            history.append(turn)
+            budget -= tokens
+        history.reverse()
+        return history
+
+    def schedule_compaction(self, user_id: int):
+        """Fold older turns into the user's summary in the background"""
+        if user_id in self._compacting:
+            return
+        self._compacting.add(user_id)
+        task = asyncio.create_task(self._compact(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, user_id: int):
+        try:
+            # Read, then release the connection: the summary call can queue behind
+            # interactive LLM traffic for a long time and must not pin a pooled connection
+            async with AsyncSessionLocal() as db:
+                summary_row = await db.get(ConversationSummary, user_id)
+                previous = summary_row.summary if summary_row else ""
+                through_id = summary_row.summarized_through_id if summary_row else 0
+
+                result = await db.execute(
+                    select(Conversation.id, Conversation.message, Conversation.response)
+                    .where(Conversation.user_id == user_id, Conversation.id > through_id)
+                    .order_by(Conversation.id)
+                    .limit(MEMORY_COMPACT_AFTER + MEMORY_KEEP_TURNS)
+                )
+                pending = result.all()
+            if len(pending) < MEMORY_COMPACT_AFTER:
+                return
+
+            # Oldest turns first, at most one batch per pass so a long backlog
+            # is caught up over several turns instead of one huge prompt
+            fold = pending[:len(pending) - MEMORY_KEEP_TURNS][:MEMORY_COMPACT_AFTER]
+            if not fold:
+                return
+            started = time.perf_counter()
+            summary = await ai_tutor.summarize_conversation_async(
+                previous,
+                [{"question": c.message, "answer": c.response} for c in fold],
+                max_words=MEMORY_SUMMARY_MAX_WORDS,
+            )
+            self.compaction_seconds_total += time.perf_counter() - started
+
+            values = {"summary": summary, "summarized_through_id": fold[-1].id, "updated_at": datetime.utcnow()}
+            async with AsyncSessionLocal() as db:
+                # Only if nobody (e.g. another worker) moved the summary on in the meantime
+                if summary_row is None:
+                    db.add(ConversationSummary(user_id=user_id, **values))
+                    try:
+                        await db.commit()
+                    except IntegrityError:
+                        return
+                else:
+                    result = await db.execute(
+                        update(ConversationSummary)
+                        .where(ConversationSummary.user_id == user_id,
+                               ConversationSummary.summarized_through_id == through_id)
+                        .values(**values)
+                    )
+                    await db.commit()
+                    if result.rowcount == 0:
+                        return
+            self.compactions += 1
+        except Exception as e:
+            self.compaction_failures += 1
+            print(f"⚠️ Conversation compaction failed for user {user_id}: {e}")
+        finally:
+            self._compacting.discard(user_id)
+
+    async def stop(self):
+        """Let in-flight compactions finish (called from the FastAPI lifespan)"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "prompts": self.prompts,
+            "avg_memory_tokens": self.prompt_tokens_total / self.prompts if self.prompts else 0,
+            "max_memory_tokens": self.prompt_tokens_max,
+            "compactions": self.compactions,
+            "compaction_failures": self.compaction_failures,
+            "avg_compaction_ms": 1000 * self.compaction_seconds_total / self.compactions if self.compactions else 0,
+        }
+
+
+conversation_memory = ConversationMemory()
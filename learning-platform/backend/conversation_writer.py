@@ -0,0 +1,183 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from database import AsyncSessionLocal
+from models import Conversation
+from metrics import CONVERSATION_FLUSH_SECONDS
+
+# Chat turns are queued and inserted in batches after the response is sent
+CONVERSATION_WRITE_BEHIND = os.getenv("CONVERSATION_WRITE_BEHIND", "True") == "True"
+# Longest a queued turn waits before its batch is written (seconds)
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.05"))
+# Flush early once this many turns are queued; also the rows per INSERT statement
+CONVERSATION_FLUSH_ROWS = int(os.getenv("CONVERSATION_FLUSH_ROWS", "200"))
+# Past this backlog (e.g. the database is down) chat requests wait for a flush
+CONVERSATION_QUEUE_MAX = int(os.getenv("CONVERSATION_QUEUE_MAX", "5000"))
+# Attempts for the final flush at shutdown before queued turns are given up
+CONVERSATION_SHUTDOWN_ATTEMPTS = 3
+
+
+class ConversationWriter:
+    """Write-behind queue for Conversation rows: multi-row INSERTs every few ms, off the response path"""
+
+    def __init__(self, enabled: bool = CONVERSATION_WRITE_BEHIND, interval: float = CONVERSATION_FLUSH_INTERVAL,
+                 batch_rows: int = CONVERSATION_FLUSH_ROWS, queue_max: int = CONVERSATION_QUEUE_MAX):
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_rows = batch_rows
+        self.queue_max = queue_max
+        self._pending = []  # row dicts waiting for the next flush, oldest first
+        self._flushing = []  # rows in the INSERT currently running
+        self._lock = asyncio.Lock()
+        self._wakeup = None
+        self._full = None
+        self._task = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flush_failures = 0
+        self.flush_seconds_total = 0.0
+
+    async def start(self):
+        """Start the flush loop (called from the FastAPI lifespan)"""
+        if not self.enabled:
+            return
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop and write everything still queued"""
+        if self._task is not None:
+            # Cancel between flushes, never in the middle of an INSERT
+            async with self._lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for attempt in range(CONVERSATION_SHUTDOWN_ATTEMPTS):
+            if not self._pending:
+                return
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(2 ** attempt)
+        if self._pending:
+            self.rows_dropped += len(self._pending)
+            print(f"❌ {len(self._pending)} conversation turns could not be written at shutdown")
+            self._pending = []
+
+    async def add(self, user_id: int, message: str, response: str, topic_id: int = None) -> str:
+        """Queue a chat turn; returns its public id right away"""
+        row = {
+            "public_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "topic_id": topic_id,
+            "message": message,
+            "response": response,
+            "timestamp": datetime.utcnow(),
+        }
+        if self._task is None:
+            # Write-behind disabled, or running outside the app (scripts): write now
+            await self._insert([row])
+            return row["public_id"]
+
+        if len(self._pending) >= self.queue_max:
+            await self.flush()  # backpressure instead of unbounded memory
+        self._pending.append(row)
+        self._wakeup.set()
+        if len(self._pending) >= self.batch_rows:
+            self._full.set()
+        return row["public_id"]
+
+    def pending_turns(self, user_id: int) -> list:
+        """Queued turns not yet in the database, newest first, so the next prompt still sees them"""
+        return [row for row in reversed(self._flushing + self._pending) if row["user_id"] == user_id]
+
+    async def flush(self):
+        """Write all queued rows; on a database error they stay queued for the next attempt"""
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            self._flushing = batch
+            started = time.perf_counter()
+            try:
+                await self._insert_batch(batch)
+            except Exception:
+                self._pending[:0] = batch
+                self.flush_failures += 1
+                raise
+            finally:
+                self._flushing = []
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.flush_seconds_total += elapsed
+            CONVERSATION_FLUSH_SECONDS.observe(elapsed)
+
+    async def _insert(self, rows: list):
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(rows), self.batch_rows):
+                # One multi-row INSERT ... VALUES per chunk, all in one transaction
+                await db.execute(insert(Conversation).values(rows[start:start + self.batch_rows]))
+            await db.commit()
+        self.rows_written += len(rows)
+
+    async def _insert_batch(self, batch: list):
+        try:
+            await self._insert(batch)
+        except IntegrityError:
+            # One bad row (e.g. a user id that does not exist) must not block the queue:
+            # write the rest one by one and drop only the rows the database rejects
+            for i, row in enumerate(batch):
+                try:
+                    await self._insert([row])
+                except IntegrityError as e:
+                    self.rows_dropped += 1
+                    print(f"⚠️ Dropped conversation turn for user {row['user_id']}: {e.orig}")
+                except Exception:
+                    del batch[:i]  # rows before i are written; flush() requeues the rest
+                    raise
+
+    async def _run(self):
+        failures = 0
+        while True:
+            await self._wakeup.wait()
+            # Give the batch up to one interval to fill, unless it already has
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._full.clear()
+            try:
+                await self.flush()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"⚠️ Conversation flush failed, {len(self._pending)} turns queued: {e}")
+                self._wakeup.set()
+                await asyncio.sleep(min(5.0, self.interval * 2 ** failures))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "queued": len(self._pending) + len(self._flushing),
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "avg_rows_per_flush": self.rows_written / self.flushes if self.flushes else 0,
+            "avg_flush_ms": 1000 * self.flush_seconds_total / self.flushes if self.flushes else 0,
+        }
+
+
+conversation_writer = ConversationWriter()
@@ -1,41 +1,247 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from models import Base
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).parent / ".env")
 
+from metrics import DB_CHECKOUT_WAIT, instrument_engine
+
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read-only replica for dashboards and history; falls back to the primary
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+# Connection pool settings; defaults match SQLAlchemy's except recycle and pre-ping
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True") == "True"
+# asyncpg prepared-statement cache; set to 0 behind PgBouncer/Neon pooled endpoints
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_SSL = os.getenv("DB_SSL", "require")  # "disable" for a local Postgres without TLS
+# After a replica error, send reads to the primary for this long
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+
+def _normalize_url(url: str) -> str:
+    # Normalize to asyncpg driver and strip unsupported query params
+    if not url.startswith(("postgresql://", "postgres://")):
+        return url  # e.g. sqlite+aiosqlite:///bench.db for local benchmarks
+    url = url.split("?")[0]  # asyncpg doesn't support ?sslmode= etc.
+    url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url.replace("postgres://", "postgresql+asyncpg://", 1)
+
+
+class PoolStats:
+    """Checkout wait times per pool, so pool_size/max_overflow can be sized from data"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_stats = {"primary": PoolStats(), "replica": PoolStats()}
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited (including new connects)"""
+
+    role = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            pool_stats[self.role].record(waited)
+            DB_CHECKOUT_WAIT.labels(self.role).observe(waited)
+
+
+class ReplicaTimedQueuePool(TimedQueuePool):
+    role = "replica"
+
+
+def _make_engine(url: str, poolclass):
+    url = _normalize_url(url)
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg://"):
+        connect_args["statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        if DB_SSL != "disable":
+            connect_args["ssl"] = DB_SSL
+
+    engine = create_async_engine(
+        url,
+        echo=True if os.getenv("DEBUG") == "True" else False,
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    instrument_engine(engine)
+    return engine
+
+
+_engines = {}  # built on first use so importing this module never touches the driver
+
+
+def get_engine():
+    """Primary engine, created on first use"""
+    if "primary" not in _engines:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL environment variable is not set.")
+        _engines["primary"] = _make_engine(DATABASE_URL, TimedQueuePool)
+    return _engines["primary"]
+
+
+def get_read_engine():
+    """Replica engine, or None when DATABASE_READ_URL is not set"""
+    if "replica" not in _engines:
+        _engines["replica"] = _make_engine(DATABASE_READ_URL, ReplicaTimedQueuePool) if DATABASE_READ_URL else None
+    return _engines["replica"]
 
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL environment variable is not set.")
 
-# Normalize to asyncpg driver and strip unsupported query params
-DATABASE_URL = DATABASE_URL.split("?")[0]  # asyncpg doesn't support ?sslmode= etc.
-DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
+def __getattr__(name):
+    # Keep `from database import engine` working without building engines at import
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True if os.getenv("DEBUG") == "True" else False,
-    connect_args={"ssl": "require"},
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker that binds to its engine the first time a session is opened"""
+
+    def __init__(self, engine_factory, **kw):
+        super().__init__(**kw)
+        self._engine_factory = engine_factory
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._engine_factory())
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = LazySessionmaker(
+    get_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
 )
 
-AsyncSessionLocal = sessionmaker(
-    engine,
+_replica_down_until = 0.0
+
+
+class ReplicaFallbackSession(Session):
+    """Reads from the replica; if the replica cannot be reached when the session first
+    needs a connection, the session binds to the primary so that request still succeeds"""
+
+    read_bind = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        # Resolved on first use, so sessions that never query (cache hits) never connect
+        if self.read_bind is None:
+            self.read_bind = _pick_read_bind()
+        return self.read_bind
+
+
+def _pick_read_bind():
+    # Runs inside the AsyncSession's greenlet, so the sync connect below awaits the driver
+    if replica_available():
+        replica = get_read_engine().sync_engine
+        try:
+            replica.connect().close()  # a pool checkout; only dials when no idle connection is pooled
+            return replica
+        except (DBAPIError, OSError) as e:
+            if not _connection_failure(e):
+                raise
+            _mark_replica_down(e)
+    return get_engine().sync_engine
+
+
+ReadSessionLocal = sessionmaker(
     class_=AsyncSession,
+    sync_session_class=ReplicaFallbackSession,
     expire_on_commit=False,
 )
 
+
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """Bring the schema up to date; a single version check when nothing is pending"""
+    from migrations import run_migrations
+    return await run_migrations(get_engine())
+
+async def close_db():
+    """Dispose pooled connections (called from the FastAPI lifespan)"""
+    for role in list(_engines):
+        if _engines[role] is not None:
+            await _engines[role].dispose()
+    _engines.clear()
+    AsyncSessionLocal.configure(bind=None)
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+def replica_available() -> bool:
+    """True when a read replica is configured and not backed off after a connection failure"""
+    return get_read_engine() is not None and time.monotonic() >= _replica_down_until
+
+def _connection_failure(e: Exception) -> bool:
+    # Connection-level failures only; ordinary query errors stay on the replica
+    return isinstance(e, (OSError, InterfaceError, OperationalError)) or getattr(e, "connection_invalidated", False)
+
+def _mark_replica_down(e: Exception):
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    print(f"⚠️ Read replica unavailable, using primary for {DB_REPLICA_RETRY_SECONDS:.0f}s: {e}")
+
+async def get_read_db():
+    """Session on the read replica when configured and healthy, otherwise the primary"""
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        except (DBAPIError, OSError) as e:
+            # The replica failed after its first connection: later requests go to the primary
+            read_bind = session.sync_session.read_bind
+            if read_bind is not None and read_bind is not get_engine().sync_engine and _connection_failure(e):
+                _mark_replica_down(e)
+            raise
+        finally:
+            await session.close()
+
+def pool_status() -> dict:
+    """Pool occupancy and checkout wait stats for the primary and (if any) replica"""
+    status = {}
+    for role in ("primary", "replica"):
+        eng = _engines.get(role)
+        if eng is None:
+            continue
+        pool = eng.sync_engine.pool
+        stats = pool_stats[role]
+        status[role] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": stats.checkouts,
+            "avg_wait_ms": 1000 * stats.wait_seconds_total / stats.checkouts if stats.checkouts else 0,
+            "max_wait_ms": 1000 * stats.wait_seconds_max,
+        }
+    return status
@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+import anyio
+from dotenv import load_dotenv
+from sqlalchemy import select
+from fastapi.responses import StreamingResponse
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from database import ReadSessionLocal
+from models import Progress, Conversation
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Rows fetched per server-side cursor round trip; also the rows encoded into each response chunk
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+# Exports running at once; each holds a pooled connection for its whole duration
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+# zlib level for ?gzip=true (1 = fastest, 9 = smallest); compression runs on the event loop between batches
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "1"))
+
+# table -> (model, column the since/until filters apply to, exported columns)
+EXPORT_TABLES = {
+    "progress": (Progress, "last_practiced", [
+        "id", "user_id", "topic_id", "topic_name", "mastery_level",
+        "problems_attempted", "problems_correct", "last_practiced",
+    ]),
+    "conversations": (Conversation, "timestamp", [
+        "id", "public_id", "user_id", "topic_id", "message", "response", "timestamp",
+    ]),
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def ndjson_chunk(columns: list, rows) -> bytes:
+    if orjson is not None:
+        # orjson writes naive datetimes in the same isoformat as the fallback below
+        return b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+    return "".join(
+        json.dumps(dict(zip(columns, map(_value, row))), separators=(",", ":")) + "\n" for row in rows
+    ).encode()
+
+
+def naive_utc(value: datetime):
+    """The timestamp columns are naive UTC; '...Z' or '+02:00' filters are converted to match"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([None if v is None else _value(v) for v in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+class ExportSlot:
+    """One of the EXPORT_MAX_CONCURRENT slots, held from the request until its stream ends"""
+
+    def __init__(self, exporter):
+        self._exporter = exporter
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._exporter.active -= 1
+
+
+class ExportResponse(StreamingResponse):
+    """Frees the export slot even when the client leaves before the body starts streaming"""
+
+    def __init__(self, content, slot: ExportSlot, **kw):
+        super().__init__(content, **kw)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # A disconnect can leave the generator suspended; close it now rather than at GC
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+            self.slot.release()
+
+
+class Exporter:
+    """Streams whole tables as NDJSON or CSV through a server-side cursor, one batch in memory at a time"""
+
+    def __init__(self, batch_rows: int = EXPORT_BATCH_ROWS, max_concurrent: int = EXPORT_MAX_CONCURRENT,
+                 gzip_level: int = EXPORT_GZIP_LEVEL):
+        self.batch_rows = batch_rows
+        self.max_concurrent = max_concurrent
+        self.gzip_level = gzip_level
+        self.active = 0
+        self.exports = 0
+        self.rows_exported = 0
+        self.failures = 0
+
+    def reserve(self):
+        """Take an export slot before the response starts, or None when all are in use"""
+        if self.active >= self.max_concurrent:
+            return None
+        self.active += 1
+        self.exports += 1
+        return ExportSlot(self)
+
+    def query(self, table: str, user_ids: list = None, since: datetime = None, until: datetime = None,
+              after_id: int = None):
+        """SELECT of the exported columns in primary-key order; after_id resumes an interrupted export"""
+        model, time_column, columns = EXPORT_TABLES[table]
+        query = select(*[getattr(model, name) for name in columns]).order_by(model.id)
+        if user_ids:
+            query = query.where(model.user_id.in_(user_ids))
+        if since is not None:
+            query = query.where(getattr(model, time_column) >= naive_utc(since))
+        if until is not None:
+            query = query.where(getattr(model, time_column) < naive_utc(until))
+        if after_id is not None:
+            query = query.where(model.id > after_id)
+        # Plain column rows (no ORM identity map), fetched batch_rows at a time from a server-side cursor
+        return query.execution_options(yield_per=self.batch_rows)
+
+    async def stream(self, table: str, fmt: str, query, slot: ExportSlot, compress: bool = False):
+        """Response body chunks. A database error mid-export aborts the response, so the client
+        sees a truncated transfer rather than a file that looks complete"""
+        columns = EXPORT_TABLES[table][2]
+        encoder = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31) if compress else None  # 31: gzip framing
+        started = time.perf_counter()
+        rows = 0
+        db = ReadSessionLocal()
+        try:
+            result = await db.stream(query)
+            header = csv_chunk([columns]) if fmt == "csv" else b""
+            async for batch in result.partitions():
+                chunk = ndjson_chunk(columns, batch) if fmt == "ndjson" else header + csv_chunk(batch)
+                header = b""
+                rows += len(batch)
+                self.rows_exported += len(batch)
+                if encoder is not None:
+                    chunk = encoder.compress(chunk)
+                    if not chunk:
+                        continue  # zlib is still buffering
+                yield chunk
+            if header:
+                # No rows matched: a CSV still gets its header line
+                yield encoder.compress(header) if encoder else header
+            if encoder is not None:
+                yield encoder.flush()
+            print(f"📤 Exported {rows} {table} rows as {fmt} in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ {table} export failed after {rows} rows: {e}")
+            raise
+        finally:
+            # Client disconnects arrive as a cancellation that is re-delivered on every step;
+            # unshielded, the close never finishes and the connection never returns to the pool
+            with anyio.CancelScope(shield=True):
+                await db.close()
+            slot.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "exports": self.exports,
+            "rows_exported": self.rows_exported,
+            "failures": self.failures,
+        }
+
+
+exporter = Exporter()
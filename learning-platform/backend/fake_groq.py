@@ -0,0 +1,193 @@
+"""OpenAI-compatible stand-in for Groq, for benchmarks and offline development.
+
+Run it and point the backend at it:
+
+    python fake_groq.py --port 9100 --latency 0.8 --jitter 0.3 --error-rate 0.01
+    GROQ_BASE_URL=http://127.0.0.1:9100/openai/v1 GROQ_API_KEY=fake uvicorn main:app
+
+--record FILE proxies to the real Groq API (needs GROQ_API_KEY) and appends each
+exchange to a JSONL file; --replay FILE serves those recorded responses again so
+benchmark runs are deterministic.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+from contextlib import asynccontextmanager
+from pathlib import Path
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Defaults; the CLI flags below override them
+CONFIG = {
+    "latency": float(os.getenv("FAKE_GROQ_LATENCY", "0.5")),  # mean seconds to first token
+    "jitter": float(os.getenv("FAKE_GROQ_JITTER", "0.2")),  # +/- seconds, uniform
+    "token_delay": float(os.getenv("FAKE_GROQ_TOKEN_DELAY", "0.01")),  # per streamed word
+    "error_rate": float(os.getenv("FAKE_GROQ_ERROR_RATE", "0")),  # share of 500 responses
+    "rate_limit_rate": float(os.getenv("FAKE_GROQ_RATE_LIMIT_RATE", "0")),  # share of 429 responses
+    "retry_after": os.getenv("FAKE_GROQ_RETRY_AFTER", "1"),
+    "seed": os.getenv("FAKE_GROQ_SEED"),
+    "record": os.getenv("FAKE_GROQ_RECORD"),
+    "replay": os.getenv("FAKE_GROQ_REPLAY"),
+    "upstream": os.getenv("FAKE_GROQ_UPSTREAM", "https://api.groq.com/openai/v1"),
+}
+
+# Canned replies in the formats the AITutor parsers expect, picked by system prompt
+CANNED = {
+    "problem generator": "QUESTION: A train travels 120 km in 2 hours. What is its average speed in km/h?\n"
+                         "SOLUTION: Speed = distance / time = 120 / 2 = 60. Final answer: 60 km/h\n"
+                         "HINTS: Divide distance by time; Keep the units in km and hours",
+    "grader": "CORRECT: Partial\nSCORE: 60\nFEEDBACK: The approach is right, but the explanation skips "
+              "the step where the units are converted. Show that step explicitly.",
+    "curriculum": "1. Foundations\n2. Core concepts\n3. Worked problems\n4. Applications\n5. Advanced topics",
+    "summarize": "The student is practising the topic step by step and understood the basic idea "
+                 "but still confuses when to apply each rule.",
+}
+DEFAULT_REPLY = ("Good question! What do you already know about this? Try writing down the first step, "
+                 "and tell me where you get stuck.")
+
+_random = random.Random()
+_recorded = {}
+_stats = {"requests": 0, "errors": 0, "rate_limited": 0, "replayed": 0}
+
+
+def request_key(body: dict) -> str:
+    """Stable key for a completion request: model and messages only"""
+    raw = json.dumps({"model": body.get("model"), "messages": body.get("messages")}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _canned_reply(body: dict) -> str:
+    messages = body.get("messages") or []
+    system = messages[0]["content"].lower() if messages and messages[0]["role"] == "system" else ""
+    for marker, reply in CANNED.items():
+        if marker in system:
+            return reply
+    return DEFAULT_REPLY
+
+
+def _usage(body: dict, content: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages") or []) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _load_replay(path: str):
+    if not path or not Path(path).exists():
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                _recorded[entry["key"]] = entry["content"]
+    print(f"🎞️ Loaded {len(_recorded)} recorded responses from {path}")
+
+
+async def _record(body: dict) -> str:
+    """Forward to the real API and append the exchange to the recording"""
+    async with httpx.AsyncClient(base_url=CONFIG["upstream"], timeout=120) as client:
+        response = await client.post(
+            "/chat/completions",
+            headers={"Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}"},
+            json={**body, "stream": False},
+        )
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+    with open(CONFIG["record"], "a") as f:
+        f.write(json.dumps({"key": request_key(body), "content": content}) + "\n")
+    return content
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CONFIG["seed"] is not None:
+        _random.seed(int(CONFIG["seed"]))
+    _load_replay(CONFIG["replay"])
+    yield
+
+
+app = FastAPI(title="Fake Groq", lifespan=lifespan)
+
+
+@app.get("/stats")
+async def stats():
+    return _stats
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _stats["requests"] += 1
+
+    roll = _random.random()
+    if roll < CONFIG["rate_limit_rate"]:
+        _stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+            status_code=429, headers={"retry-after": CONFIG["retry_after"]},
+        )
+    if roll < CONFIG["rate_limit_rate"] + CONFIG["error_rate"]:
+        _stats["errors"] += 1
+        return JSONResponse({"error": {"message": "Internal server error"}}, status_code=500)
+
+    key = request_key(body)
+    if CONFIG["record"]:
+        content = await _record(body)
+    elif key in _recorded:
+        _stats["replayed"] += 1
+        content = _recorded[key]
+    else:
+        content = _canned_reply(body)
+
+    await asyncio.sleep(max(0.0, CONFIG["latency"] + _random.uniform(-CONFIG["jitter"], CONFIG["jitter"])))
+    usage = _usage(body, content)
+
+    if body.get("stream"):
+        async def events():
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                delta = word if i == len(words) - 1 else word + " "
+                yield "data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": delta}}]}) + "\n\n"
+                await asyncio.sleep(CONFIG["token_delay"])
+            final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+            yield "data: " + json.dumps(final) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "id": f"fake-{key[:12]}",
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible Groq server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=CONFIG["latency"])
+    parser.add_argument("--jitter", type=float, default=CONFIG["jitter"])
+    parser.add_argument("--token-delay", type=float, default=CONFIG["token_delay"])
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"])
+    parser.add_argument("--rate-limit-rate", type=float, default=CONFIG["rate_limit_rate"])
+    parser.add_argument("--retry-after", default=CONFIG["retry_after"])
+    parser.add_argument("--seed", default=CONFIG["seed"])
+    parser.add_argument("--record", default=CONFIG["record"], help="proxy to Groq and append exchanges to this JSONL file")
+    parser.add_argument("--replay", default=CONFIG["replay"], help="serve responses recorded with --record")
+    args = parser.parse_args()
+
+    CONFIG.update({k: v for k, v in vars(args).items() if k in CONFIG})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,173 @@
+import re
+from fractions import Fraction
+
+# Explicit final-answer markers the problem generator tends to use in SOLUTION text
+FINAL_ANSWER_PATTERNS = [
+    re.compile(r"\\boxed\{([^{}]+)\}"),
+    re.compile(r"final answer\s*(?:is)?\s*[:=]?\s*(.+)", re.IGNORECASE),
+    re.compile(r"(?:the )?(?:correct )?answer is\s*[:=]?\s*(.+)", re.IGNORECASE),
+    re.compile(r"^\s*answer\s*[:=]\s*(.+)", re.IGNORECASE | re.MULTILINE),
+]
+
+# Two or more lines like "A) ...", "(b) ...", "C. ..." mark a multiple-choice question
+MCQ_OPTION = re.compile(r"(?m)^\s*\(?([A-Ea-e])[\).:]\s+\S")
+MCQ_ANSWER = re.compile(r"^\s*(?:option|choice)?\s*\(?([A-Ea-e])\)?(?:[\).:]|\s|$)", re.IGNORECASE)
+
+NUMBER = re.compile(
+    r"^(?:[a-z]\s*=\s*)?"                       # optional "x =" prefix
+    r"(?P<num>[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|[-+]?\.\d+)"
+    r"(?:\s*/\s*(?P<den>\d+))?"                 # optional fraction denominator
+    r"\s*(?P<unit>[a-z°%/^²³]*)$",              # optional unit, checked against UNITS
+    re.IGNORECASE,
+)
+
+# Units a numeric answer may carry, with spelling variants mapped to one form. Anything else after
+# the number ("2x", "3n") is an expression, not a quantity. Single letters that double as algebra
+# variables (n, k, a, v, ...) are left out on purpose
+UNITS = {
+    "%": "%", "°": "°", "deg": "°", "degree": "°", "degrees": "°", "rad": "rad", "°c": "°c", "°f": "°f",
+    "mm": "mm", "cm": "cm", "m": "m", "km": "km", "in": "in", "ft": "ft", "yd": "yd", "mi": "mi",
+    "mg": "mg", "g": "g", "kg": "kg", "lb": "lb", "lbs": "lb", "oz": "oz",
+    "ms": "ms", "s": "s", "sec": "s", "min": "min", "h": "h", "hr": "h", "hrs": "h",
+    "ml": "ml", "l": "l",
+    "cm²": "cm²", "cm^2": "cm²", "m²": "m²", "m^2": "m²", "cm³": "cm³", "cm^3": "cm³", "m³": "m³", "m^3": "m³",
+    "m/s": "m/s", "m/s²": "m/s²", "m/s^2": "m/s²", "km/h": "km/h", "mph": "mph",
+    "hz": "hz", "khz": "khz", "kj": "kj", "kw": "kw", "pa": "pa", "kpa": "kpa", "mol": "mol",
+}
+
+# Short free-text answers ("Paris", "photosynthesis") only ever grade as correct locally
+MAX_TOKEN_WORDS = 3
+
+
+def extract_final_answer(solution: str):
+    """Pull the final answer out of a step-by-step solution, or None if there is no marker"""
+    if not solution:
+        return None
+    for pattern in FINAL_ANSWER_PATTERNS:
+        matches = pattern.findall(solution)
+        if matches:
+            return _clean(matches[-1].splitlines()[0])
+    # A one-line solution is its own final answer
+    if "\n" not in solution.strip() and len(solution.split()) <= MAX_TOKEN_WORDS:
+        return _clean(solution)
+    return None
+
+
+def _clean(text: str) -> str:
+    text = text.strip().strip("*$` ")
+    return text.rstrip(".;,!").strip()
+
+
+def _parse_number(text: str):
+    """Return (value, decimal_places, unit) for a numeric answer, or None"""
+    match = NUMBER.match(text.replace(" ", "") if "/" in text else text.strip())
+    if not match:
+        return None
+    num = match.group("num").replace(",", "")
+    value = Fraction(num)
+    if match.group("den"):
+        if int(match.group("den")) == 0:
+            return None
+        value /= int(match.group("den"))
+        places = None
+    else:
+        places = len(num.split(".")[1]) if "." in num else None
+    unit = match.group("unit").lower()
+    if unit and unit not in UNITS:
+        return None
+    return value, places, UNITS.get(unit, "")
+
+
+def _numbers_match(expected, given) -> bool:
+    expected_value, _, _ = expected
+    given_value, given_places, _ = given
+    if expected_value == given_value:
+        return True
+    # Accept a decimal rounded to two or more places, e.g. 0.33 for 1/3
+    if given_places is not None and given_places >= 2:
+        return abs(expected_value - given_value) <= Fraction(1, 2 * 10 ** given_places)
+    return False
+
+
+def _mcq_choice(text: str):
+    match = MCQ_ANSWER.match(text)
+    return match.group(1).upper() if match else None
+
+
+def _normalize_token(text: str) -> str:
+    text = re.sub(r"[^\w\s]", "", text.casefold())
+    words = [w for w in text.split() if w not in ("a", "an", "the")]
+    return " ".join(words)
+
+
+def _result(is_correct: bool, expected: str, given: str) -> dict:
+    if is_correct:
+        feedback = f"Correct! Your answer {given} matches the expected answer."
+    else:
+        feedback = f"Not quite. You answered {given}, but the expected answer is {expected}. Review the solution steps to see where it differs."
+    return {
+        "is_correct": is_correct,
+        "score": 100 if is_correct else 0,
+        "feedback": feedback,
+    }
+
+
+def quick_grade(question: str, student_answer: str, correct_solution: str):
+    """Grade numeric, fraction, unit and multiple-choice answers locally.
+
+    Returns the same {is_correct, score, feedback} dict as AITutor.assess_answer,
+    or None when the answer is open-ended or ambiguous and needs the LLM.
+    """
+    given = _clean(student_answer or "")
+    expected = extract_final_answer(correct_solution)
+    if not given or not expected:
+        return None
+
+    # Multiple choice: compare option letters
+    if len(MCQ_OPTION.findall(question or "")) >= 2:
+        expected_choice = _mcq_choice(expected)
+        given_choice = _mcq_choice(given)
+        if expected_choice and given_choice:
+            return _result(expected_choice == given_choice, expected_choice, given_choice)
+        return None
+
+    # Numbers, fractions and quantities with units
+    expected_number = _parse_number(expected)
+    given_number = _parse_number(given)
+    if expected_number and given_number:
+        if expected_number[2] and given_number[2] and expected_number[2] != given_number[2]:
+            return None  # 10 cm vs 10 m: equal numbers are not equal quantities
+        is_correct = _numbers_match(expected_number, given_number)
+        if not is_correct and expected_number[2] != given_number[2]:
+            return None  # e.g. 50% vs 0.5 or cm vs m; let the LLM handle conversions
+        return _result(is_correct, expected, given)
+    if expected_number or given_number:
+        return None
+
+    # Short exact tokens: only a match is conclusive, a mismatch may be a synonym
+    if len(given.split()) <= MAX_TOKEN_WORDS and len(expected.split()) <= MAX_TOKEN_WORDS:
+        if _normalize_token(given) and _normalize_token(given) == _normalize_token(expected):
+            return _result(True, expected, given)
+    return None
+
+
+if __name__ == "__main__":
+    # Quick self-check: python grader.py
+    def grade(answer, solution, question="Solve it"):
+        result = quick_grade(question, answer, solution)
+        return None if result is None else result["is_correct"]
+
+    assert grade("10", "Final answer: 10") is True
+    assert grade("0.33", "Final answer: 1/3") is True
+    assert grade("11", "Final answer: 10") is False
+    assert grade("10 m", "Final answer: 10 m") is True
+    assert grade("10", "Final answer: 10 m") is True  # unit left off
+    assert grade("10 hrs", "Final answer: 10 h") is True
+    assert grade("10 cm", "Final answer: 10 m") is None  # different units go to the LLM
+    assert grade("1000 cm", "Final answer: 10 m") is None
+    assert grade("2", "Final answer: 2x") is None  # an expression, not a number with a unit
+    assert grade("2x", "Final answer: 2") is None
+    assert grade("2x", "Final answer: 2x") is True  # short-token match
+    assert grade("50%", "Final answer: 0.5") is None
+    assert grade("B", "Answer: B", "Pick one\nA) 1\nB) 2") is True
+    print("✅ grader self-check passed")
@@ -1,37 +1,89 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import select, text, cast, tuple_, Float
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime
 import asyncio
-import uvicorn
+import base64
+import hmac
+import json
 import os
+import uvicorn
 
 load_dotenv(Path(__file__).parent / ".env")
 
-from database import get_db, init_db
+# /health gives up on the database ping after this many seconds
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))
+
+# Quiz grading: items per /api/problems/assess-batch call and concurrent LLM gradings
+ASSESS_BATCH_MAX_ITEMS = int(os.getenv("ASSESS_BATCH_MAX_ITEMS", "50"))
+ASSESS_BATCH_CONCURRENCY = int(os.getenv("ASSESS_BATCH_CONCURRENCY", "4"))
+
+# Bearer token for /api/admin/* (data exports); those endpoints are disabled while it is unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+# Progress topic for problems saved with neither a topic id nor a name (the dashboard's label for them)
+UNKNOWN_TOPIC = "Unknown"
+
+from database import get_db, get_read_db, init_db, close_db, pool_status, AsyncSessionLocal
+from migrations import DB_MIGRATE_ON_STARTUP
 from models import User, Course, Topic, Problem, Progress, Conversation
-from ai_tutor import ai_tutor
+from ai_tutor import ai_tutor, LLMUnavailable, AI_MODEL
+from grader import quick_grade
+from problem_inventory import problem_inventory, problem_to_dict, stock_key
+from user_registry import user_registry
+from conversation_memory import conversation_memory
+from conversation_writer import conversation_writer
+from chat_sessions import chat_sessions
+from answer_index import answer_index
+from progress_view import progress_view
+from exports import exporter, ExportResponse, EXPORT_FORMATS
+import metrics
+
+
+# Set once this process can serve traffic; /ready answers 503 before that and while shutting down
+_ready = asyncio.Event()
+
+
+async def _warm_up():
+    """Open this worker's first pooled connection so the first request does not pay for it"""
+    try:
+        async with AsyncSessionLocal() as session:
+            await asyncio.wait_for(session.execute(text("SELECT 1")), HEALTH_DB_TIMEOUT)
+    except Exception as e:
+        print(f"⚠️ Database warm-up failed: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
-    # Add topic_name column if it doesn't exist (migration for existing DBs)
-    from database import engine
-    async with engine.begin() as conn:
-        await conn.execute(text(
-            "ALTER TABLE progress ADD COLUMN IF NOT EXISTS topic_name VARCHAR;"
-        ))
+    if DB_MIGRATE_ON_STARTUP:
+        await init_db()
     print("✅ Database initialized")
-    print("✅ Server ready!")
-    yield
+    await _warm_up()
+    await ai_tutor.open()
+    await problem_inventory.start()
+    await conversation_writer.start()
+    _ready.set()
+    print(f"✅ Server ready! (pid {os.getpid()})")
+    try:
+        yield
+    finally:
+        _ready.clear()
+        await problem_inventory.stop()
+        # Queued chat turns are written before the database pools close
+        await conversation_writer.stop()
+        await conversation_memory.stop()
+        await ai_tutor.close()
+        await close_db()
 
 
 app = FastAPI(title="Personalized Learning Platform API", lifespan=lifespan)
@@ -43,6 +95,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailable):
+    # Backpressure, rate limits, timeouts and upstream failures; nothing was persisted
+    headers = {"Retry-After": str(int(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
 
 class UserCreate(BaseModel):
     username: str
@@ -75,6 +134,16 @@ class DirectAssessRequest(BaseModel):
     answer: str
     solution: str
 
+class BatchAssessItem(BaseModel):
+    topic_name: str
+    question: str
+    answer: str
+    solution: str
+
+class BatchAssessRequest(BaseModel):
+    user_id: int
+    items: List[BatchAssessItem]
+
 
 
 @app.get("/")
@@ -86,20 +155,73 @@ async def root():
             "health": "/health",
             "users": "/api/users",
             "chat": "/api/chat",
+            "chat-stream": "/api/chat/stream",
+            "chat-websocket": "/ws/chat/{user_id}",
             "problems": "/api/problems",
             "learning-path": "/api/learning-path"
         }
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Load-balancer probe: cheap, no database or upstream calls"""
+    if not _ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready", "pid": os.getpid()}
+
+
 @app.get("/health")
 async def health_check():
     groq_key = os.getenv("GROQ_API_KEY")
-    return {
-        "status": "healthy",
-        "database": "connected",
-        "ai_service": "connected" if groq_key else "missing key",
+    try:
+        async with AsyncSessionLocal() as session:
+            await asyncio.wait_for(session.execute(text("SELECT 1")), HEALTH_DB_TIMEOUT)
+        database = "connected"
+    except Exception as e:
+        database = f"unreachable: {e.__class__.__name__}"
+
+    breaker = ai_tutor.breaker.stats()["state"]
+    if not groq_key:
+        ai_service = "missing key"
+    elif breaker != "closed":
+        ai_service = f"circuit {breaker}"
+    else:
+        ai_service = "connected"
+
+    healthy = database == "connected"
+    body = {
+        "status": "healthy" if healthy and ai_service == "connected" else "degraded",
+        "database": database,
+        "ai_service": ai_service,
+        "ai_cache": ai_tutor.cache.stats(),
+        "ai_inflight": ai_tutor.flight.stats(),
+        "ai_scheduler": ai_tutor.scheduler.stats(),
+        "ai_resilience": {
+            **ai_tutor.breaker.stats(),
+            "retries": ai_tutor.retries,
+            "hedges": ai_tutor.hedges,
+            "hedge_wins": ai_tutor.hedge_wins,
+            "escalations": ai_tutor.escalations,
+        },
+        "user_cache": user_registry.stats(),
+        "conversation_memory": conversation_memory.stats(),
+        "conversation_writer": conversation_writer.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "answer_index": answer_index.stats(),
+        "problem_stock": problem_inventory.stats(),
+        "progress_cache": progress_view.stats(),
+        "exports": exporter.stats(),
+        "db_pools": pool_status(),
     }
+    # Only a dead database takes the instance out of rotation; without the LLM it still serves dashboards
+    return JSONResponse(body, status_code=200 if healthy else 503)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 @app.post("/api/users")
@@ -112,78 +234,178 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     except IntegrityError:
         await db.rollback()
         raise HTTPException(status_code=400, detail="Username or email already exists")
+    user_registry.remember(new_user)
     return {"user_id": new_user.id, "username": new_user.username}
 
 
 @app.get("/api/users/{user_id}")
-async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    user = await user_registry.get(db, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "created_at": user.created_at
-    }
+    return user
 
 
 @app.post("/api/chat")
 async def chat_with_tutor(request: ChatRequest, db: AsyncSession = Depends(get_db)):
-    # Validate user exists
-    user_check = await db.execute(select(User).where(User.id == request.user_id))
-    if not user_check.scalar_one_or_none():
+    # Validate user exists (served from the user registry when warm)
+    if not await user_registry.exists(db, request.user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
-    result = await db.execute(
-        select(Conversation)
-        .where(Conversation.user_id == request.user_id)
-        .order_by(Conversation.timestamp.desc())
-        .limit(3)
-    )
-    recent_conversations = result.scalars().all()
-    
-    history = [
-        {"question": conv.message, "answer": conv.response}
-        for conv in reversed(recent_conversations)
-    ]
-    
-    response = await asyncio.to_thread(
-        ai_tutor.tutor_chat,
+    summary, history = await conversation_memory.load(db, request.user_id)
+    # End the read transaction so the connection is not held idle during the LLM call
+    await db.commit()
+
+    response = await ai_tutor.tutor_chat_async(
         student_question=request.message,
         topic=request.topic,
-        conversation_history=history
+        conversation_history=history,
+        summary=summary
     )
     
-    conversation = Conversation(
-        user_id=request.user_id,
-        message=request.message,
-        response=response,
-        topic_id=None
-    )
-    db.add(conversation)
-    await db.commit()
-    await db.refresh(conversation)  # Fix: populate conversation.id after commit
+    # Written in the next batch by the write-behind queue; the response does not wait for it
+    conversation_id = await conversation_writer.add(request.user_id, request.message, response)
+    conversation_memory.schedule_compaction(request.user_id)
     
     return {
         "response": response,
-        "conversation_id": conversation.id
+        "conversation_id": conversation_id
     }
 
 
-@app.post("/api/problems/generate")
-async def generate_problem(request: ProblemGenerateRequest):
-    problem_data = await asyncio.to_thread(
-        ai_tutor.generate_practice_problem,
-        topic=request.topic,
-        difficulty=request.difficulty,
-        problem_type=request.problem_type
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_with_tutor_stream(request: ChatRequest, db: AsyncSession = Depends(get_db)):
+    """Stream the tutor reply as Server-Sent Events, persisting the turn when it completes."""
+    # Validate user exists (served from the user registry when warm)
+    if not await user_registry.exists(db, request.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Reject before the 200 is sent if the LLM queue is already full
+    ai_tutor.scheduler.admit("chat")
+    summary, history = await conversation_memory.load(db, request.user_id)
+    # Dependencies are torn down only after the response ends; hand the connection back
+    # now so a slow client does not hold it for the whole stream (the turn is written
+    # by the write-behind queue in its own session)
+    await db.close()
+
+    async def event_stream():
+        chunks = []
+        try:
+            async for chunk in ai_tutor.tutor_chat_stream(
+                student_question=request.message,
+                topic=request.topic,
+                conversation_history=history,
+                summary=summary
+            ):
+                chunks.append(chunk)
+                yield _sse({"delta": chunk})
+        except LLMUnavailable as e:
+            # Headers are already sent; report it in-stream and do not persist the turn
+            yield _sse({"detail": str(e), "retry_after": e.retry_after}, event="error")
+            return
+
+        conversation_id = await conversation_writer.add(request.user_id, request.message, "".join(chunks))
+        conversation_memory.schedule_compaction(request.user_id)
+
+        yield _sse({"conversation_id": conversation_id}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+
+@app.websocket("/ws/chat/{user_id}")
+async def chat_websocket(websocket: WebSocket, user_id: int):
+    """Tutor session over a WebSocket: the user is checked once and history stays in memory between turns.
+
+    Client sends {"message": ..., "topic": ...}; server replies with "delta" events, then "done" or "error".
+    """
+    async with AsyncSessionLocal() as db:
+        exists = await user_registry.exists(db, user_id)
+    if not exists:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    chat_sessions.connections += 1
+    try:
+        await websocket.send_json({"type": "ready", "user_id": user_id})
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+                message = str(data.get("message") or "").strip()
+            except (ValueError, AttributeError):
+                await websocket.send_json({"type": "error", "detail": "Expected a JSON object with a message"})
+                continue
+            if not message:
+                await websocket.send_json({"type": "error", "detail": "Message is empty"})
+                continue
+
+            session = await chat_sessions.get(user_id)
+            if "topic" in data:
+                session.topic = data["topic"] or None
+
+            chunks = []
+            try:
+                ai_tutor.scheduler.admit("chat")
+                async for chunk in ai_tutor.tutor_chat_stream(
+                    student_question=message,
+                    topic=session.topic,
+                    conversation_history=session.history,
+                    summary=session.summary
+                ):
+                    chunks.append(chunk)
+                    await websocket.send_json({"type": "delta", "delta": chunk})
+            except LLMUnavailable as e:
+                # The turn is not persisted; the session stays open for a retry
+                await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+                continue
+
+            response = "".join(chunks)
+            session.record(message, response)
+            conversation_id = await conversation_writer.add(user_id, message, response)
+            conversation_memory.schedule_compaction(user_id)
+            await websocket.send_json({"type": "done", "conversation_id": conversation_id})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_sessions.connections -= 1
+
+
+@app.post("/api/problems/generate")
+async def generate_problem(request: ProblemGenerateRequest, db: AsyncSession = Depends(get_db)):
+    key = stock_key(request.topic, request.difficulty, request.problem_type)
+
+    problem = await problem_inventory.pop(db, key)
+    if problem:
+        problem_data = problem_to_dict(problem)
+    else:
+        # Cold miss: generate live and keep the row so the answer can be submitted by id.
+        # Uncached, so asking again for a new problem gets a different one; identical
+        # requests in flight at the same moment still share one generation
+        problem_data = await ai_tutor.generate_practice_problem_async(
+            topic=request.topic,
+            difficulty=request.difficulty,
+            problem_type=request.problem_type,
+            cache=False,
+            coalesce=True
+        )
+        problem = await problem_inventory.store(db, key, request.difficulty, problem_data, served=True)
+        problem_data["problem_id"] = problem.id if problem else None
+
+    problem_inventory.request_refill(key)
     
     return {
+        "problem_id": problem_data["problem_id"],
         "question": problem_data["question"],
         "solution": problem_data["solution"],
         "hints": problem_data["hints"],
@@ -192,11 +414,152 @@ async def generate_problem(request: ProblemGenerateRequest):
     }
 
 
+@app.post("/api/problems/generate/stream")
+async def generate_problem_stream(request: ProblemGenerateRequest, db: AsyncSession = Depends(get_db)):
+    """Stream a problem as Server-Sent Events: the question first, then solution and hints as they are written."""
+    key = stock_key(request.topic, request.difficulty, request.problem_type)
+
+    problem = await problem_inventory.pop(db, key)
+    problem_inventory.request_refill(key)
+    if problem is None:
+        # Reject before the 200 is sent if the LLM queue is already full
+        ai_tutor.scheduler.admit("generation")
+
+    async def sections():
+        if problem is not None:
+            stocked = problem_to_dict(problem)
+            for section in ("question", "solution", "hints"):
+                yield section, stocked[section]
+        else:
+            async for section in ai_tutor.generate_practice_problem_stream(
+                topic=request.topic,
+                difficulty=request.difficulty,
+                problem_type=request.problem_type
+            ):
+                yield section
+
+    async def event_stream():
+        problem_data = {}
+        try:
+            async for section, value in sections():
+                problem_data[section] = value
+                data = {section: value}
+                if section == "question":
+                    data.update(
+                        problem_id=problem.id if problem is not None else None,
+                        topic=request.topic,
+                        difficulty=request.difficulty,
+                    )
+                yield _sse(data, event=section)
+        except LLMUnavailable as e:
+            yield _sse({"detail": str(e), "retry_after": e.retry_after}, event="error")
+            return
+
+        problem_id = problem.id if problem is not None else None
+        if problem is None:
+            # Keep the full problem server-side so the answer can be submitted by id
+            async with AsyncSessionLocal() as session:
+                stored = await problem_inventory.store(session, key, request.difficulty, problem_data, served=True)
+            problem_id = stored.id if stored else None
+
+        yield _sse({"problem_id": problem_id}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _grade(question: str, answer: str, solution: str) -> dict:
+    # Checkable answers (numbers, fractions, MCQ letters) are graded locally
+    assessment = quick_grade(question, answer, solution)
+    if assessment is None:
+        assessment = await ai_tutor.assess_answer_async(
+            question=question,
+            student_answer=answer,
+            correct_solution=solution
+        )
+    return assessment
+
+
+async def _record_attempts(db: AsyncSession, user_id: int, tallies: dict, by: str = "topic_name") -> dict:
+    """Add {topic: (attempted, correct)} to the user's progress in one INSERT ... ON CONFLICT DO UPDATE.
+
+    Counters are incremented and mastery recomputed in SQL, so concurrent answers for the
+    same topic cannot lose updates. `by` picks the unique key: "topic_name" or "topic_id".
+    """
+    if not tallies:
+        return {}
+    if None in tallies:
+        # NULLs never conflict in a unique index, so a NULL key would insert a new row every time
+        raise ValueError("progress topic key must not be None")
+
+    now = datetime.utcnow()
+    # SQLite (local benchmarks) has the same ON CONFLICT DO UPDATE construct
+    insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+    stmt = insert(Progress).values([
+        {
+            "user_id": user_id,
+            "topic_id": topic if by == "topic_id" else None,
+            "topic_name": topic if by == "topic_name" else None,
+            "problems_attempted": attempted,
+            "problems_correct": correct,
+            "mastery_level": correct / attempted,
+            "last_practiced": now,
+        }
+        for topic, (attempted, correct) in tallies.items()
+    ])
+    attempted_total = Progress.problems_attempted + stmt.excluded.problems_attempted
+    correct_total = Progress.problems_correct + stmt.excluded.problems_correct
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Progress.user_id, getattr(Progress, by)],
+        set_={
+            "problems_attempted": attempted_total,
+            "problems_correct": correct_total,
+            "mastery_level": cast(correct_total, Float) / cast(attempted_total, Float),
+            "last_practiced": stmt.excluded.last_practiced,
+        },
+    ).returning(
+        getattr(Progress, by),
+        Progress.problems_attempted,
+        Progress.problems_correct,
+        Progress.mastery_level,
+    )
+
+    try:
+        result = await db.execute(stmt)
+    except IntegrityError as e:
+        # Unique conflicts are handled by the upsert, so this is the users.id foreign key
+        await db.rollback()
+        if "foreign key" not in str(e.orig).lower():
+            raise
+        user_registry.mark_missing(user_id)
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return {
+        row[0]: {
+            "problems_attempted": row.problems_attempted,
+            "problems_correct": row.problems_correct,
+            "mastery_level": row.mastery_level,
+        }
+        for row in result.all()
+    }
+
+
+def _progress_topic(problem: Problem) -> tuple:
+    """(unique key column, value) of the progress row an answer to this problem counts towards"""
+    if problem.topic_id is not None:
+        return "topic_id", problem.topic_id
+    # Stocked problems have no Topic row; track them by topic name like assess-direct.
+    # Older rows may have no name either and are pooled under one per-user topic
+    return "topic_name", problem.topic_name or UNKNOWN_TOPIC
+
+
 @app.post("/api/problems/submit")
 async def submit_answer(request: AnswerSubmitRequest, db: AsyncSession = Depends(get_db)):
-    # Validate user exists
-    user_check = await db.execute(select(User).where(User.id == request.user_id))
-    if not user_check.scalar_one_or_none():
+    # Unknown users are rejected by the progress foreign key; only skip work for known-missing ones
+    if user_registry.known_missing(request.user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
     result = await db.execute(select(Problem).where(Problem.id == request.problem_id))
@@ -205,99 +568,87 @@ async def submit_answer(request: AnswerSubmitRequest, db: AsyncSession = Depends
     if not problem:
         raise HTTPException(status_code=404, detail="Problem not found")
     
-    assessment = await asyncio.to_thread(
-        ai_tutor.assess_answer,
-        question=problem.question,
-        student_answer=request.answer,
-        correct_solution=problem.solution
-    )
-    
-    result = await db.execute(
-        select(Progress).where(
-            Progress.user_id == request.user_id,
-            Progress.topic_id == problem.topic_id
-        )
-    )
-    progress = result.scalar_one_or_none()
+    assessment = await _grade(problem.question, request.answer, problem.solution)
     
-    if progress:
-        progress.problems_attempted += 1
-        if assessment["is_correct"]:
-            progress.problems_correct += 1
-        progress.mastery_level = progress.problems_correct / progress.problems_attempted
-        progress.last_practiced = datetime.utcnow()
-    else:
-        # First attempt for this topic — create a new progress record
-        is_correct = assessment["is_correct"]
-        progress = Progress(
-            user_id=request.user_id,
-            topic_id=problem.topic_id,
-            problems_attempted=1,
-            problems_correct=1 if is_correct else 0,
-            mastery_level=1.0 if is_correct else 0.0,
-        )
-        db.add(progress)
-
+    is_correct = 1 if assessment["is_correct"] else 0
+    by, topic = _progress_topic(problem)
+    progress = await _record_attempts(db, request.user_id, {topic: (1, is_correct)}, by=by)
     await db.commit()
+    progress_view.invalidate(request.user_id)
     
     return {
         "assessment": assessment,
-        "progress_updated": True
+        "progress_updated": True,
+        "progress": next(iter(progress.values()))
     }
 
 
 @app.post("/api/problems/assess-direct")
 async def assess_direct(request: DirectAssessRequest, db: AsyncSession = Depends(get_db)):
     """Assess an on-the-fly problem (no saved Problem row) and track progress by topic name."""
-    # Validate user exists
-    user_check = await db.execute(select(User).where(User.id == request.user_id))
-    if not user_check.scalar_one_or_none():
+    # Unknown users are rejected by the progress foreign key; only skip work for known-missing ones
+    if user_registry.known_missing(request.user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
-    assessment = await asyncio.to_thread(
-        ai_tutor.assess_answer,
-        question=request.question,
-        student_answer=request.answer,
-        correct_solution=request.solution
-    )
+    assessment = await _grade(request.question, request.answer, request.solution)
 
-    # Find existing progress record by user + topic_name (case-insensitive)
+    # Progress is tracked by user + topic_name (case-insensitive)
     normalized_topic = request.topic_name.strip().lower()
-    result = await db.execute(
-        select(Progress).where(
-            Progress.user_id == request.user_id,
-            Progress.topic_name == normalized_topic
-        )
-    )
-    progress = result.scalar_one_or_none()
-
-    if progress:
-        progress.problems_attempted += 1
-        if assessment["is_correct"]:
-            progress.problems_correct += 1
-        progress.mastery_level = progress.problems_correct / progress.problems_attempted
-        progress.last_practiced = datetime.utcnow()
-    else:
-        is_correct = assessment["is_correct"]
-        progress = Progress(
-            user_id=request.user_id,
-            topic_id=None,
-            topic_name=normalized_topic,
-            problems_attempted=1,
-            problems_correct=1 if is_correct else 0,
-            mastery_level=1.0 if is_correct else 0.0,
-        )
-        db.add(progress)
+    is_correct = 1 if assessment["is_correct"] else 0
+    progress = await _record_attempts(db, request.user_id, {normalized_topic: (1, is_correct)})
+    await db.commit()
+    progress_view.invalidate(request.user_id)
+
+    return {"assessment": assessment, "progress": progress[normalized_topic]}
 
+
+@app.post("/api/problems/assess-batch")
+async def assess_batch(request: BatchAssessRequest, db: AsyncSession = Depends(get_db)):
+    """Grade a whole quiz at once and apply all progress updates in one transaction."""
+    if len(request.items) > ASSESS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {ASSESS_BATCH_MAX_ITEMS} items per batch")
+
+    # Unknown users are rejected by the progress foreign key; only skip work for known-missing ones
+    if user_registry.known_missing(request.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    semaphore = asyncio.Semaphore(ASSESS_BATCH_CONCURRENCY)
+
+    async def grade_item(item: BatchAssessItem):
+        async with semaphore:
+            try:
+                return await _grade(item.question, item.answer, item.solution)
+            except LLMUnavailable as e:
+                return e
+
+    results = await asyncio.gather(*(grade_item(item) for item in request.items))
+    failures = [r for r in results if isinstance(r, LLMUnavailable)]
+    if failures and len(failures) == len(results):
+        raise failures[0]
+
+    # Tally attempts per topic so every affected progress row is updated in one statement;
+    # items the LLM could not grade are reported back and not counted as attempts
+    tallies = {}
+    assessments = []
+    for item, assessment in zip(request.items, results):
+        if isinstance(assessment, LLMUnavailable):
+            assessments.append({"is_correct": None, "score": None, "feedback": str(assessment), "graded": False})
+            continue
+        assessments.append(assessment)
+        topic_name = item.topic_name.strip().lower()
+        attempted, correct = tallies.get(topic_name, (0, 0))
+        tallies[topic_name] = (attempted + 1, correct + (1 if assessment["is_correct"] else 0))
+
+    await _record_attempts(db, request.user_id, tallies)
     await db.commit()
+    progress_view.invalidate(request.user_id)
 
-    return {"assessment": assessment}
+    return {"assessments": assessments}
 
 
 @app.post("/api/learning-path")
 async def generate_learning_path(request: LearningPathRequest):
-    topics = await asyncio.to_thread(
-        ai_tutor.generate_learning_path,
+    topics = await ai_tutor.generate_learning_path_async(
         subject=request.subject,
         current_level=request.current_level,
         goals=request.goals
@@ -312,35 +663,125 @@ async def generate_learning_path(request: LearningPathRequest):
 
 
 @app.get("/api/users/{user_id}/progress")
-async def get_user_progress(user_id: int, db: AsyncSession = Depends(get_db)):
-    user_check = await db.execute(select(User).where(User.id == user_id))
-    if not user_check.scalar_one_or_none():
+async def get_user_progress(
+    user_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    primary_db: AsyncSession = Depends(get_db),
+):
+    """Dashboard read model; unchanged dashboards get a 304 without a database round trip."""
+    if_none_match = request.headers.get("if-none-match")
+
+    cached = progress_view.cached(user_id)
+    if cached is None:
+        # Sessions connect lazily, so only the one chosen here checks out a connection
+        if progress_view.needs_primary(user_id):
+            db = primary_db
+        if not await user_registry.exists(db, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        cached = await progress_view.rebuild(db, user_id)
+    etag, body = cached
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match == etag:
+        progress_view.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _encode_cursor(conversation: Conversation) -> str:
+    raw = f"{conversation.timestamp.isoformat()}|{conversation.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, conversation_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/api/users/{user_id}/conversations")
+async def get_conversation_history(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Newest-first chat history; pass next_cursor back as `before` to page further back."""
+    if not await user_registry.exists(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
+    query = select(Conversation).where(Conversation.user_id == user_id)
+    if before:
+        # Keyset pagination: seek past the last row seen instead of OFFSET
+        timestamp, conversation_id = _decode_cursor(before)
+        query = query.where(
+            tuple_(Conversation.timestamp, Conversation.id) < tuple_(timestamp, conversation_id)
+        )
     result = await db.execute(
-        select(Progress).where(Progress.user_id == user_id)
+        query.order_by(Conversation.timestamp.desc(), Conversation.id.desc()).limit(limit + 1)
     )
-    progress_records = result.scalars().all()
-    
+    conversations = result.scalars().all()
+
+    has_more = len(conversations) > limit
+    conversations = conversations[:limit]
+
     return {
         "user_id": user_id,
-        "topics_in_progress": len(progress_records),
-        "progress": [
+        "conversations": [
             {
-                "topic_id": p.topic_id,
-                "topic_name": p.topic_name or (f"Topic {p.topic_id}" if p.topic_id else "Unknown"),
-                "mastery_level": p.mastery_level,
-                "problems_attempted": p.problems_attempted,
-                "problems_correct": p.problems_correct,
-                "accuracy": (p.problems_correct / p.problems_attempted * 100) if p.problems_attempted > 0 else 0
+                "id": c.id,
+                "conversation_id": c.public_id,
+                "message": c.message,
+                "response": c.response,
+                "timestamp": c.timestamp,
             }
-            for p in progress_records
-        ]
+            for c in conversations
+        ],
+        "next_cursor": _encode_cursor(conversations[-1]) if has_more else None,
     }
 
 
+def require_admin(request: Request):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_TOKEN is not set)")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/api/admin/export/{table}", dependencies=[Depends(require_admin)])
+async def export_table(
+    table: Literal["progress", "conversations"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    user_id: Optional[List[int]] = Query(None),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    gzip: bool = False,
+):
+    """Full-table dump streamed from a server-side cursor; memory use does not grow with the table.
+    Filters: user_id (repeatable), since/until on last_practiced or timestamp, after_id to resume."""
+    query = exporter.query(table, user_id, since, until, after_id)
+    # Reserved here, not when the body starts, so concurrent requests cannot all pass the check
+    slot = exporter.reserve()
+    if slot is None:
+        raise HTTPException(status_code=429, detail="Too many exports running, try again shortly",
+                            headers={"Retry-After": "30"})
+    filename = f"{table}-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}" + (".gz" if gzip else "")
+    return ExportResponse(
+        exporter.stream(table, format, query, slot, compress=gzip),
+        slot,
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+
 if __name__ == "__main__":
+    # One process, as before; `python serve.py` is the multi-worker launcher
     print("🚀 Starting Personalized Learning Platform API...")
-    print("🤖 AI Model in use: llama-3.3-70b-versatile (Groq API)")
+    print(f"🤖 AI Model in use: {AI_MODEL} (Groq API)")
     print("=" * 50)
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
@@ -0,0 +1,213 @@
+import os
+import time
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+# Buckets from 5 ms to 2 min; LLM calls live in the upper half
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency until the last body byte, by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_STAGE = Histogram(
+    "http_request_stage_seconds", "Time a request spent in each stage (db, llm_queue, llm)",
+    ["route", "stage"], buckets=LATENCY_BUCKETS,
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Groq call latency including retries, by AITutor method",
+    ["method", "outcome"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported in Groq usage, by AITutor method",
+    ["method", "type"],
+)
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds", "Time waiting for an LLM scheduler slot, by priority",
+    ["priority"], buckets=LATENCY_BUCKETS,
+)
+DB_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time to check a connection out of the pool",
+    ["pool"], buckets=LATENCY_BUCKETS,
+)
+CONVERSATION_FLUSH_SECONDS = Histogram(
+    "conversation_flush_seconds", "Time to write one batch of queued conversation turns",
+    buckets=LATENCY_BUCKETS,
+)
+ANSWER_INDEX_LOOKUP = Histogram(
+    "answer_index_lookup_seconds", "Near-duplicate answer index lookup time",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+
+STAGES = ("db", "llm_queue", "llm")
+
+# Per-request stage totals; child tasks share the dict, so their time is attributed too
+_request_stages = ContextVar("request_stages", default=None)
+
+
+def add_stage_time(stage: str, seconds: float):
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] += seconds
+
+
+def record_usage(method: str, usage: dict):
+    """Count prompt/completion tokens from an OpenAI-style usage block"""
+    if not usage:
+        return
+    if usage.get("prompt_tokens"):
+        LLM_TOKENS.labels(method, "prompt").inc(usage["prompt_tokens"])
+    if usage.get("completion_tokens"):
+        LLM_TOKENS.labels(method, "completion").inc(usage["completion_tokens"])
+
+
+def instrument_engine(engine):
+    """Attribute statement execution time to the current request's db stage"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        add_stage_time("db", time.perf_counter() - context._metrics_started)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request to its last body byte (so SSE streams count in full)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages = dict.fromkeys(STAGES, 0.0)
+        token = _request_stages.set(stages)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_stages.reset(token)
+            # Route templates keep label cardinality bounded (/api/users/{user_id}, not /api/users/42)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], path, str(status)).observe(time.perf_counter() - started)
+            for stage, seconds in stages.items():
+                if seconds:
+                    REQUEST_STAGE.labels(path, stage).observe(seconds)
+
+
+def _gauge(name: str, documentation: str, value) -> GaugeMetricFamily:
+    return GaugeMetricFamily(name, documentation, value=float(value))
+
+
+class AppStatsCollector:
+    """Exports the in-process counters behind /health (caches, scheduler, pools) at scrape time"""
+
+    def describe(self):
+        return []  # skip the collect() call at registration; the sources are not imported yet
+
+    def collect(self):
+        # Imported lazily: those modules import this one for their histograms
+        from ai_tutor import ai_tutor, LLM_PRIORITIES
+        from database import pool_status
+        from user_registry import user_registry
+        from progress_view import progress_view
+        from conversation_memory import conversation_memory
+        from answer_index import answer_index
+        from conversation_writer import conversation_writer
+        from chat_sessions import chat_sessions
+        from exports import exporter
+
+        cache = ai_tutor.cache.stats()
+        yield _gauge("llm_cache_hits", "LLM cache hits from the in-process tier", cache["hits"] - cache["persistent_hits"])
+        yield _gauge("llm_cache_persistent_hits", "LLM cache hits from the llm_cache table", cache["persistent_hits"])
+        yield _gauge("llm_cache_misses", "LLM cache misses", cache["misses"])
+        yield _gauge("llm_cache_entries", "Entries in the in-process LLM cache", cache["entries"])
+        yield _gauge("llm_coalesced", "LLM calls served by another in-flight identical call", ai_tutor.flight.stats()["coalesced"])
+
+        scheduler = ai_tutor.scheduler.stats()
+        yield _gauge("llm_scheduler_active", "LLM calls holding a scheduler slot", scheduler["active"])
+        queued = GaugeMetricFamily("llm_scheduler_queued", "LLM calls waiting for a slot", labels=["priority"])
+        rejected = GaugeMetricFamily("llm_scheduler_rejected", "LLM calls rejected by backpressure", labels=["priority"])
+        for priority in LLM_PRIORITIES:
+            queued.add_metric([priority], scheduler["queued"][priority])
+            rejected.add_metric([priority], scheduler["rejected"][priority])
+        yield queued
+        yield rejected
+        yield _gauge("llm_rate_limited", "Groq 429/503 responses that paused the scheduler", scheduler["rate_limited"])
+
+        breaker = ai_tutor.breaker.stats()
+        yield _gauge("llm_circuit_open", "1 while the Groq circuit breaker is open or half-open", breaker["state"] != "closed")
+        yield _gauge("llm_circuit_trips", "Times the Groq circuit breaker opened", breaker["trips"])
+        yield _gauge("llm_retries", "Groq call retries", ai_tutor.retries)
+        yield _gauge("llm_hedges", "Hedged duplicate Groq requests sent", ai_tutor.hedges)
+        yield _gauge("llm_escalations", "Fast-model replies re-run on AI_MODEL after failing their parser", ai_tutor.escalations)
+
+        users = user_registry.stats()
+        yield _gauge("user_cache_hits", "User registry hits", users["hits"])
+        yield _gauge("user_cache_misses", "User registry misses", users["misses"])
+        progress = progress_view.stats()
+        yield _gauge("progress_cache_hits", "Dashboard read-model hits", progress["hits"])
+        yield _gauge("progress_cache_not_modified", "Dashboard 304 responses", progress["not_modified"])
+        yield _gauge("progress_cache_rebuilds", "Dashboard read-model rebuilds", progress["rebuilds"])
+        answers = answer_index.stats()
+        yield _gauge("answer_index_hits", "Chat turns answered from the near-duplicate index", answers["hits"])
+        yield _gauge("answer_index_misses", "Index lookups that fell through to the LLM", answers["misses"])
+        yield _gauge("answer_index_entries", "Answers held in the near-duplicate index", answers["entries"])
+        sessions = chat_sessions.stats()
+        yield _gauge("chat_ws_connections", "Open tutor WebSocket connections", sessions["connections"])
+        yield _gauge("chat_sessions", "Tutor sessions held in memory", sessions["sessions"])
+        yield _gauge("chat_session_hits", "WebSocket turns served from in-memory session state", sessions["hits"])
+        yield _gauge("chat_session_loads", "Session loads from the database", sessions["loads"])
+        yield _gauge("chat_session_evictions", "Sessions evicted for idleness or the memory cap", sessions["evictions"])
+        writer = conversation_writer.stats()
+        yield _gauge("conversation_write_queue", "Conversation turns queued or being written", writer["queued"])
+        yield _gauge("conversation_rows_written", "Conversation turns written by the write-behind queue", writer["rows_written"])
+        yield _gauge("conversation_rows_dropped", "Conversation turns the database rejected or that were lost at shutdown", writer["rows_dropped"])
+        yield _gauge("conversation_flush_failures", "Failed conversation batch writes (retried)", writer["flush_failures"])
+        yield _gauge("conversation_compactions", "Conversation summary compactions", conversation_memory.stats()["compactions"])
+        exports = exporter.stats()
+        yield _gauge("exports_active", "Admin table exports streaming now", exports["active"])
+        yield _gauge("export_rows", "Rows streamed by admin table exports", exports["rows_exported"])
+
+        pool_families = {
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["pool"]),
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["pool"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Overflow connections (negative: unused capacity)", labels=["pool"]),
+            "checkouts": GaugeMetricFamily("db_pool_checkouts", "Connection checkouts", labels=["pool"]),
+        }
+        for pool, status in pool_status().items():
+            for key, family in pool_families.items():
+                family.add_metric([pool], status[key])
+        yield from pool_families.values()
+
+
+_app_stats = AppStatsCollector()
+REGISTRY.register(_app_stats)
+
+
+def render() -> tuple:
+    """(body, content type) for the /metrics endpoint"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Under serve.py each worker writes its histograms and counters to the shared
+        # directory; whichever worker answers the scrape merges them. The app-stats
+        # gauges are the answering worker's own.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_app_stats)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
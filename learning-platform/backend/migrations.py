@@ -0,0 +1,169 @@
+import asyncio
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from models import Base
+
+# Run pending migrations from the FastAPI lifespan; set to False when a release
+# step runs `python migrations.py` before the workers start
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "True") == "True"
+# Key for pg_advisory_xact_lock so only one booting worker applies migrations
+MIGRATION_LOCK_KEY = 7210431
+
+
+async def _baseline(conn):
+    await conn.run_sync(Base.metadata.create_all)
+
+
+# Existing databases may be at any version, so every migration after the baseline
+# must be idempotent (IF NOT EXISTS); fresh databases only run the baseline
+_PROGRESS_DEDUPE = """
+    WITH totals AS (
+        SELECT user_id, {column}, MIN(id) AS keep_id,
+               SUM(problems_attempted) AS attempted,
+               SUM(problems_correct) AS correct,
+               MAX(last_practiced) AS last_practiced
+        FROM progress WHERE {column} IS NOT NULL
+        GROUP BY user_id, {column} HAVING COUNT(*) > 1
+    )
+    UPDATE progress p SET
+        problems_attempted = t.attempted,
+        problems_correct = t.correct,
+        mastery_level = CASE WHEN t.attempted > 0 THEN t.correct::float / t.attempted ELSE 0 END,
+        last_practiced = t.last_practiced
+    FROM totals t WHERE p.id = t.keep_id;
+"""
+
+_PROGRESS_DELETE_DUPLICATES = """
+    DELETE FROM progress p USING progress k
+    WHERE p.user_id = k.user_id AND p.{column} = k.{column} AND p.id > k.id;
+"""
+
+_PROGRESS_UNTOPICED_DEDUPE = """
+    WITH totals AS (
+        SELECT user_id, MIN(id) AS keep_id,
+               SUM(problems_attempted) AS attempted,
+               SUM(problems_correct) AS correct,
+               MAX(last_practiced) AS last_practiced
+        FROM progress WHERE topic_id IS NULL AND topic_name IS NULL
+        GROUP BY user_id HAVING COUNT(*) > 1
+    )
+    UPDATE progress p SET
+        problems_attempted = t.attempted,
+        problems_correct = t.correct,
+        mastery_level = CASE WHEN t.attempted > 0 THEN t.correct::float / t.attempted ELSE 0 END,
+        last_practiced = t.last_practiced
+    FROM totals t WHERE p.id = t.keep_id;
+"""
+
+# (version, name, steps); a step is a SQL string or an async callable taking the connection
+MIGRATIONS = [
+    (1, "baseline schema", [_baseline]),
+    (2, "progress topic_name", [
+        "ALTER TABLE progress ADD COLUMN IF NOT EXISTS topic_name VARCHAR;",
+    ]),
+    (3, "problem stock columns", [
+        "ALTER TABLE problems ADD COLUMN IF NOT EXISTS topic_name VARCHAR;",
+        "ALTER TABLE problems ADD COLUMN IF NOT EXISTS difficulty_level VARCHAR;",
+        "ALTER TABLE problems ADD COLUMN IF NOT EXISTS served_at TIMESTAMP WITHOUT TIME ZONE;",
+        "CREATE INDEX IF NOT EXISTS ix_problems_stock ON problems "
+        "(topic_name, difficulty_level, problem_type) WHERE served_at IS NULL;",
+    ]),
+    # One progress row per (user, topic): fold any duplicates left by the old
+    # read-modify-write path into the oldest row, then enforce uniqueness
+    (4, "unique progress per user and topic", [
+        _PROGRESS_DEDUPE.format(column="topic_name"),
+        _PROGRESS_DELETE_DUPLICATES.format(column="topic_name"),
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_progress_user_topic_name ON progress (user_id, topic_name);",
+        _PROGRESS_DEDUPE.format(column="topic_id"),
+        _PROGRESS_DELETE_DUPLICATES.format(column="topic_id"),
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_progress_user_topic_id ON progress (user_id, topic_id);",
+    ]),
+    (5, "conversation history index", [
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user_timestamp "
+        "ON conversations (user_id, timestamp DESC, id DESC);",
+    ]),
+    (6, "conversation public id", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS public_id VARCHAR(36);",
+    ]),
+    # Answers to problems with neither a topic id nor a name inserted a new row each time
+    # (NULL keys never conflict); fold them into one row per user under the 'Unknown' topic
+    (7, "fold progress rows without a topic", [
+        _PROGRESS_UNTOPICED_DEDUPE,
+        "DELETE FROM progress p USING progress k "
+        "WHERE p.user_id = k.user_id AND p.id > k.id "
+        "AND p.topic_id IS NULL AND p.topic_name IS NULL AND k.topic_id IS NULL AND k.topic_name IS NULL;",
+        "UPDATE progress p SET topic_name = 'Unknown' "
+        "WHERE p.topic_id IS NULL AND p.topic_name IS NULL AND NOT EXISTS "
+        "(SELECT 1 FROM progress u WHERE u.user_id = p.user_id AND u.topic_name = 'Unknown');",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def current_version(engine) -> int:
+    """Highest applied migration, or 0 for a database that predates the runner"""
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT MAX(version) FROM schema_migrations"))
+            return result.scalar() or 0
+    except DBAPIError:
+        return 0  # schema_migrations does not exist yet
+
+
+async def run_migrations(engine) -> list:
+    """Apply pending migrations; returns the versions applied by this process"""
+    # Fast path: one indexed read when the schema is already current
+    if await current_version(engine) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    async with engine.begin() as conn:
+        # Postgres DDL is transactional: other workers block here, then see the new version
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        fresh = not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("users"))
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP);"
+        ))
+        result = await conn.execute(text("SELECT MAX(version) FROM schema_migrations"))
+        version = result.scalar() or 0
+
+        for number, name, steps in MIGRATIONS:
+            if number <= version:
+                continue
+            # The baseline builds the current schema, so a fresh database skips the upgrades
+            for step in steps if number == 1 or not fresh else []:
+                if isinstance(step, str):
+                    await conn.execute(text(step))
+                else:
+                    await step(conn)
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": number, "name": name},
+            )
+            applied.append(number)
+            print(f"🛠️ Applied migration {number}: {name}")
+    return applied
+
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    async def _main():
+        engine = get_engine()
+        try:
+            applied = await run_migrations(engine)
+            print(f"✅ Schema at version {LATEST_VERSION} ({len(applied)} migration(s) applied)")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(_main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -53,9 +53,21 @@ class Problem(Base):
     problem_type = Column(String)
     solution = Column(Text)
     hints = Column(Text)
+    topic_name = Column(String, nullable=True)  # free-form topic name for generated stock
+    difficulty_level = Column(String, nullable=True)  # easy / medium / hard bucket
+    served_at = Column(DateTime, nullable=True)  # set when handed out from the stock
     
     topic = relationship("Topic", back_populates="problems")
 
+    __table_args__ = (
+        # Unserved stock lookup used by problem_inventory.pop()
+        Index(
+            "ix_problems_stock",
+            "topic_name", "difficulty_level", "problem_type",
+            postgresql_where=served_at.is_(None),
+        ),
+    )
+
 
 class Progress(Base):
     __tablename__ = "progress"
@@ -71,15 +83,45 @@ class Progress(Base):
     
     user = relationship("User", back_populates="progress")
 
+    __table_args__ = (
+        # Conflict targets for the atomic progress upsert in main._record_attempts
+        Index("uq_progress_user_topic_name", "user_id", "topic_name", unique=True),
+        Index("uq_progress_user_topic_id", "user_id", "topic_id", unique=True),
+    )
+
 
 class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(Integer, primary_key=True, index=True)
+    public_id = Column(String(36), nullable=True)  # UUID returned to clients before the row is written
     user_id = Column(Integer, ForeignKey("users.id"))
     topic_id = Column(Integer, ForeignKey("topics.id"), nullable=True)
     message = Column(Text)
     response = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
-    user = relationship("User", back_populates="conversations")
\ No newline at end of file
+    user = relationship("User", back_populates="conversations")
+
+    __table_args__ = (
+        # Newest-first history per user; id breaks timestamp ties for keyset pagination
+        Index("ix_conversations_user_timestamp", "user_id", timestamp.desc(), id.desc()),
+    )
+
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    summary = Column(Text, default="")
+    summarized_through_id = Column(Integer, default=0)  # last Conversation.id folded into the summary
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 of model, prompts and sampling params
+    response = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from database import AsyncSessionLocal
+from models import Problem
+from ai_tutor import ai_tutor, difficulty_bucket
+
+# Unserved problems to keep per (topic, difficulty bucket, problem type)
+PROBLEM_STOCK_TARGET = int(os.getenv("PROBLEM_STOCK_TARGET", "5"))
+# Concurrent refill workers (each makes one LLM call at a time)
+PROBLEM_STOCK_WORKERS = int(os.getenv("PROBLEM_STOCK_WORKERS", "2"))
+# Comma-separated topics stocked at startup and always kept in stock, e.g. "algebra,python basics"
+PROBLEM_STOCK_TOPICS = [t.strip().lower() for t in os.getenv("PROBLEM_STOCK_TOPICS", "").split(",") if t.strip()]
+# Other keys are stocked only after this many requests within PROBLEM_STOCK_DEMAND_WINDOW seconds,
+# so a one-off or misspelled topic costs one live generation, not a refill's worth
+PROBLEM_STOCK_MIN_REQUESTS = int(os.getenv("PROBLEM_STOCK_MIN_REQUESTS", "3"))
+PROBLEM_STOCK_DEMAND_WINDOW = float(os.getenv("PROBLEM_STOCK_DEMAND_WINDOW", "3600"))
+# Demand-stocked keys kept topped up; the least recently requested stops being refilled first
+PROBLEM_STOCK_MAX_KEYS = int(os.getenv("PROBLEM_STOCK_MAX_KEYS", "100"))
+# Keys whose recent requests are remembered while they build up demand
+DEMAND_TRACKED_KEYS = 10000
+
+# Representative difficulty used when generating stock for a bucket
+BUCKET_DIFFICULTY = {"easy": 1.5, "medium": 5.0, "hard": 8.5}
+
+
+def stock_key(topic: str, difficulty: float, problem_type: str) -> tuple:
+    """Normalize a generate request into its (topic, bucket, type) stock key"""
+    return (topic.strip().lower(), difficulty_bucket(difficulty), problem_type)
+
+
+def problem_to_dict(problem: Problem) -> dict:
+    return {
+        "problem_id": problem.id,
+        "question": problem.question,
+        "solution": problem.solution,
+        "hints": problem.hints.split(";") if problem.hints else [],
+    }
+
+
+class ProblemInventory:
+    """Keeps a pre-generated stock of practice problems in the problems table"""
+
+    def __init__(self, target: int = PROBLEM_STOCK_TARGET, workers: int = PROBLEM_STOCK_WORKERS,
+                 min_requests: int = PROBLEM_STOCK_MIN_REQUESTS, demand_window: float = PROBLEM_STOCK_DEMAND_WINDOW,
+                 max_keys: int = PROBLEM_STOCK_MAX_KEYS):
+        self.target = target
+        self.workers = workers
+        self.min_requests = min_requests
+        self.demand_window = demand_window
+        self.max_keys = max_keys
+        self._queue = None
+        self._pending = set()  # keys queued or being refilled
+        self._tasks = []
+        self._demand = OrderedDict()  # key -> recent request times (monotonic), least recently requested first
+        self._stocked = OrderedDict()  # demand-stocked keys, least recently requested first
+        self.refills = 0
+        self.skipped = 0
+        self.dropped_keys = 0
+
+    async def start(self):
+        """Start the refill workers (called from the FastAPI lifespan)"""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for topic in PROBLEM_STOCK_TOPICS:
+            for level in BUCKET_DIFFICULTY:
+                self._enqueue((topic, level, "open_ended"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._pending.clear()
+
+    def request_refill(self, key: tuple):
+        """Record a request for the key and queue a background top-up if the key is kept in stock"""
+        if self._in_demand(key):
+            self._enqueue(key)
+        else:
+            self.skipped += 1
+
+    def _in_demand(self, key: tuple) -> bool:
+        if key[0] in PROBLEM_STOCK_TOPICS:
+            return True
+        now = time.monotonic()
+        recent = [t for t in self._demand.pop(key, ()) if now - t < self.demand_window]
+        recent.append(now)
+        self._demand[key] = recent[-self.min_requests:]
+        while len(self._demand) > DEMAND_TRACKED_KEYS:
+            self._demand.popitem(last=False)
+
+        if key in self._stocked:
+            self._stocked.move_to_end(key)
+            return True
+        if len(recent) < self.min_requests:
+            return False
+        self._stocked[key] = True
+        while len(self._stocked) > self.max_keys:
+            # Its remaining stock is still served, it just is not topped up again
+            self._stocked.popitem(last=False)
+            self.dropped_keys += 1
+        return True
+
+    def _enqueue(self, key: tuple):
+        """Queue a background top-up for a stock key; duplicate requests are dropped"""
+        if self._queue is None or key in self._pending:
+            return
+        self._pending.add(key)
+        self._queue.put_nowait(key)
+
+    def _stock_filter(self, key: tuple):
+        topic_name, level, problem_type = key
+        return (
+            Problem.topic_name == topic_name,
+            Problem.difficulty_level == level,
+            Problem.problem_type == problem_type,
+            Problem.served_at.is_(None),
+        )
+
+    async def pop(self, db: AsyncSession, key: tuple):
+        """Claim one unserved problem for the key in a single UPDATE ... RETURNING"""
+        next_id = (
+            select(Problem.id)
+            .where(*self._stock_filter(key))
+            .order_by(Problem.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(Problem)
+            .where(Problem.id == next_id)
+            .values(served_at=datetime.utcnow())
+            .returning(Problem)
+            .execution_options(synchronize_session=False)
+        )
+        problem = result.scalar_one_or_none()
+        await db.commit()
+        return problem
+
+    async def store(self, db: AsyncSession, key: tuple, difficulty: float, problem_data: dict, served: bool = False):
+        """Save a generated problem; returns None if generation produced no usable problem"""
+        if problem_data["solution"] == "Solution generation failed":
+            return None
+
+        topic_name, level, problem_type = key
+        problem = Problem(
+            topic_id=None,
+            topic_name=topic_name,
+            difficulty=difficulty,
+            difficulty_level=level,
+            problem_type=problem_type,
+            question=problem_data["question"],
+            solution=problem_data["solution"],
+            hints=";".join(problem_data["hints"]),
+            served_at=datetime.utcnow() if served else None,
+        )
+        db.add(problem)
+        await db.commit()
+        await db.refresh(problem)
+        return problem
+
+    async def _refill(self, key: tuple):
+        topic_name, level, problem_type = key
+        async with AsyncSessionLocal() as db:
+            stock = await db.scalar(
+                select(func.count()).select_from(Problem).where(*self._stock_filter(key))
+            )
+
+        if stock < self.target:
+            self.refills += 1
+        for _ in range(self.target - stock):
+            problem_data = await ai_tutor.generate_practice_problem_async(
+                topic=topic_name,
+                difficulty=BUCKET_DIFFICULTY[level],
+                problem_type=problem_type,
+                # Each stocked problem must be a fresh generation
+                cache=False,
+                coalesce=False,
+                priority="background"
+            )
+            async with AsyncSessionLocal() as db:
+                if await self.store(db, key, BUCKET_DIFFICULTY[level], problem_data) is None:
+                    # Upstream is failing; retry on the next request for this key
+                    return
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                await self._refill(key)
+            except Exception as e:
+                print(f"⚠️ Problem stock refill failed for {key}: {e}")
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "stocked_keys": len(PROBLEM_STOCK_TOPICS) * len(BUCKET_DIFFICULTY) + len(self._stocked),
+            "queued": len(self._pending),
+            "refills": self.refills,
+            "refills_skipped": self.skipped,
+            "dropped_keys": self.dropped_keys,
+        }
+
+
+problem_inventory = ProblemInventory()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from models import Progress
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Cached dashboards kept in memory
+PROGRESS_CACHE_SIZE = int(os.getenv("PROGRESS_CACHE_SIZE", "5000"))
+# Upper bound on staleness when another worker process handled the write
+PROGRESS_CACHE_TTL = float(os.getenv("PROGRESS_CACHE_TTL", "30"))
+# After a write, rebuild this user's dashboard from the primary (replica lag) for this long
+PROGRESS_PRIMARY_AFTER_WRITE = float(os.getenv("PROGRESS_PRIMARY_AFTER_WRITE", "10"))
+# Topics listed under recent_activity
+RECENT_ACTIVITY_LIMIT = 5
+
+
+def dumps(payload: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=str, separators=(",", ":")).encode()
+
+
+def build_dashboard(user_id: int, progress_records: list) -> dict:
+    """Aggregate a user's progress rows into the dashboard payload"""
+    topics = [
+        {
+            "topic_id": p.topic_id,
+            "topic_name": p.topic_name or (f"Topic {p.topic_id}" if p.topic_id else "Unknown"),
+            "mastery_level": p.mastery_level,
+            "problems_attempted": p.problems_attempted,
+            "problems_correct": p.problems_correct,
+            "accuracy": (p.problems_correct / p.problems_attempted * 100) if p.problems_attempted > 0 else 0,
+            "last_practiced": p.last_practiced.isoformat() if p.last_practiced else None,
+        }
+        for p in progress_records
+    ]
+    attempted = sum(t["problems_attempted"] for t in topics)
+    correct = sum(t["problems_correct"] for t in topics)
+
+    return {
+        "user_id": user_id,
+        "topics_in_progress": len(topics),
+        "totals": {
+            "problems_attempted": attempted,
+            "problems_correct": correct,
+            "accuracy": correct / attempted * 100 if attempted > 0 else 0,
+            "average_mastery": sum(t["mastery_level"] for t in topics) / len(topics) if topics else 0,
+        },
+        "progress": topics,
+        "recent_activity": sorted(
+            (t for t in topics if t["last_practiced"]),
+            key=lambda t: t["last_practiced"],
+            reverse=True,
+        )[:RECENT_ACTIVITY_LIMIT],
+    }
+
+
+class ProgressReadModel:
+    """Per-user dashboard payloads, serialized once and served with a content-version ETag"""
+
+    def __init__(self, max_entries: int = PROGRESS_CACHE_SIZE, ttl: float = PROGRESS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, etag, body)
+        self._written = {}  # user_id -> monotonic time of the last progress write
+        # Invalidation counter: a rebuild only caches its payload if no write landed while it ran
+        self._invalidations = 0
+        self._generations = {}  # user_id -> value of _invalidations at the user's last write
+        self._generation_floor = 0  # stands in for users dropped when _generations is pruned
+        self.hits = 0
+        self.not_modified = 0
+        self.rebuilds = 0
+
+    def cached(self, user_id: int):
+        """Return (etag, body) if a fresh payload is cached, without touching the database"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, etag, body = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return etag, body
+
+    def _generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, self._generation_floor)
+
+    async def rebuild(self, db: AsyncSession, user_id: int) -> tuple:
+        generation = self._generation(user_id)
+        result = await db.execute(
+            select(Progress).where(Progress.user_id == user_id)
+        )
+        body = dumps(build_dashboard(user_id, result.scalars().all()))
+        # The version is a hash of the payload, so it stays valid across restarts and workers
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.rebuilds += 1
+        if self._generation(user_id) != generation:
+            # A write was invalidated during the SELECT: serve this once, do not cache it
+            return etag, body
+
+        self._entries[user_id] = (time.monotonic() + self.ttl, etag, body)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, user_id: int):
+        """Drop the cached dashboard; call after committing a progress write"""
+        self._entries.pop(user_id, None)
+        self._invalidations += 1
+        self._generations[user_id] = self._invalidations
+        if len(self._generations) > self.max_entries:
+            # Forgotten users read as the current count, which any in-flight rebuild sees as changed
+            self._generations = {user_id: self._invalidations}
+            self._generation_floor = self._invalidations
+        now = time.monotonic()
+        self._written[user_id] = now
+        if len(self._written) > self.max_entries:
+            self._written = {
+                k: v for k, v in self._written.items() if now - v < PROGRESS_PRIMARY_AFTER_WRITE
+            }
+
+    def needs_primary(self, user_id: int) -> bool:
+        """True if a read replica may not have this user's latest write yet"""
+        written = self._written.get(user_id)
+        return written is not None and time.monotonic() - written < PROGRESS_PRIMARY_AFTER_WRITE
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "rebuilds": self.rebuilds,
+            "entries": len(self._entries),
+        }
+
+
+progress_view = ProgressReadModel()
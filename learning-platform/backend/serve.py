@@ -0,0 +1,138 @@
+"""Production entry point: several uvicorn workers on uvloop and httptools.
+
+    python serve.py                                  # one worker
+    WEB_CONCURRENCY=4 WORKER_MAX_REQUESTS=20000 python serve.py
+
+The supervisor runs pending migrations once, binds the port, then starts the
+workers. Each worker is a fresh process that imports the app and creates its
+own database engine and Groq client on first use, so no pooled connection is
+ever shared between processes. A worker is only handed connections after its
+lifespan startup (migrations skipped, first DB connection opened) completes;
+/ready reports the same to a load balancer.
+
+On SIGTERM or SIGINT each worker stops accepting connections and gives
+in-flight requests, including streaming LLM answers, up to GRACEFUL_TIMEOUT
+seconds before it runs its shutdown (queued chat turns are flushed then).
+After WORKER_MAX_REQUESTS requests, plus jitter, a worker finishes what it
+is serving and exits, and the supervisor starts a replacement. SIGHUP
+restarts all workers one after another.
+
+Every limit the app enforces in memory is per worker: the Groq request and
+token budgets (GROQ_*_PER_MINUTE), GROQ_MAX_CONCURRENCY and
+EXPORT_MAX_CONCURRENT are each multiplied by WEB_CONCURRENCY. With several
+workers, set them to the account quota divided by the worker count.
+"""
+import asyncio
+import importlib.util
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from dotenv import load_dotenv
+import uvicorn
+
+load_dotenv(Path(__file__).parent / ".env")
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Worker processes; each has its own event loop, DB pool, HTTP client and rate limits
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Seconds a stopping worker waits for in-flight requests; above GROQ_TOTAL_TIMEOUT so LLM calls can finish
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "100"))
+# Recycle a worker after this many requests (0 = never), bounding slow growth from caches and fragmentation
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "20000"))
+# Up to this many extra requests per worker, so workers started together are not all recycled together
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", str(WORKER_MAX_REQUESTS // 10)))
+# Seconds an idle keep-alive connection is held open
+KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+async def _migrate():
+    from database import init_db, close_db
+    try:
+        await init_db()
+    finally:
+        # Dispose before the workers start; they open their own pools
+        await close_db()
+
+
+def _per_worker_limits(workers: int):
+    """Print what the per-process limits add up to across all workers"""
+    from ai_tutor import GROQ_MAX_CONCURRENCY, GROQ_MODEL_QUOTAS
+    from exports import EXPORT_MAX_CONCURRENT
+    print(f"⚠️ Limits are per worker; {workers} workers allow up to "
+          f"{workers * GROQ_MAX_CONCURRENCY} concurrent Groq calls and {workers * EXPORT_MAX_CONCURRENT} exports")
+    for model, quota in GROQ_MODEL_QUOTAS.items():
+        if quota["requests_per_minute"] or quota["tokens_per_minute"]:
+            print(f"⚠️ {model}: up to {workers * quota['requests_per_minute']} requests and "
+                  f"{workers * quota['tokens_per_minute']} tokens per minute in total")
+    print("⚠️ Set the GROQ_*_PER_MINUTE budgets to the account quota divided by WEB_CONCURRENCY")
+
+
+def prepare(workers: int):
+    """Supervisor-side setup that must happen once, before any worker starts"""
+    from migrations import DB_MIGRATE_ON_STARTUP
+    if DB_MIGRATE_ON_STARTUP:
+        asyncio.run(_migrate())
+        print("✅ Database migrated")
+    # Workers inherit the environment: skip the migration check in each of them
+    os.environ["DB_MIGRATE_ON_STARTUP"] = "False"
+
+    if workers > 1:
+        # Per-process metric files, merged by whichever worker answers /metrics
+        metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)  # counters from a previous run
+            os.makedirs(metrics_dir, exist_ok=True)
+        else:
+            # A private directory, removed again when the supervisor exits
+            metrics_dir = tempfile.mkdtemp(prefix="learning-platform-metrics-")
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+            return metrics_dir
+    return None
+
+
+def main(workers: int = WEB_CONCURRENCY):
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    max_requests = WORKER_MAX_REQUESTS or None
+    if workers == 1 and max_requests:
+        # With one worker there is no supervisor to start a replacement
+        print("⚠️ WORKER_MAX_REQUESTS needs WEB_CONCURRENCY > 1; worker recycling disabled")
+        max_requests = None
+
+    print("🚀 Starting Personalized Learning Platform API...")
+    print(f"⚙️ {workers} worker(s) on {HOST}:{PORT}, loop={loop}, http={http}, "
+          f"max requests={max_requests or 'unlimited'}, graceful timeout={GRACEFUL_TIMEOUT:g}s")
+    if workers > 1:
+        _per_worker_limits(workers)
+    print("=" * 50)
+
+    metrics_dir = prepare(workers)
+    try:
+        uvicorn.run(
+            "main:app",
+            host=HOST,
+            port=PORT,
+            workers=workers,
+            loop=loop,
+            http=http,
+            timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+            timeout_keep_alive=KEEPALIVE_TIMEOUT,
+            limit_max_requests=max_requests,
+            limit_max_requests_jitter=WORKER_MAX_REQUESTS_JITTER if max_requests else 0,
+            log_level=LOG_LEVEL,
+            server_header=False,
+        )
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Unit tests for the AI tutor's scheduling and resilience pieces; no Groq key or server needed.
+
+    pytest test_ai_tutor.py
+"""
+import asyncio
+import httpx
+import pytest
+
+from ai_tutor import (
+    AI_MODEL, AITutor, CircuitBreaker, LLMCircuitOpen, LLMOverloaded, LLMScheduler, LLMTimeout,
+    LLMUpstreamError, ModelQuota, ProblemStreamParser, SingleFlight, TokenBucket,
+)
+
+UNLIMITED = {AI_MODEL: {"requests_per_minute": 0, "tokens_per_minute": 0}}
+
+
+async def _settle():
+    # Let queued tasks run up to their next await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+# --- LLMScheduler ---
+
+def test_waiters_are_served_in_priority_order():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1, quotas=UNLIMITED)
+        order = []
+
+        async def call(name, priority):
+            async with scheduler.slot(priority, 10):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("background", 10)  # holds the only slot
+        tasks = [asyncio.create_task(call(name, priority)) for name, priority in
+                 [("gen", "generation"), ("bg", "background"), ("gr", "grading"), ("chat", "chat")]]
+        await _settle()
+        assert order == []
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["chat", "gr", "gen", "bg"]
+
+
+def test_full_queue_rejects_low_priority_and_sheds_for_higher():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1, quotas=UNLIMITED, max_queue=2)
+        await scheduler.acquire("chat", 10)
+        generation = asyncio.create_task(scheduler.acquire("generation", 10))
+        background = asyncio.create_task(scheduler.acquire("background", 10))
+        await _settle()
+
+        # Full: a call that does not outrank the lowest waiter is turned away at once
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire("background", 10)
+        with pytest.raises(LLMOverloaded):
+            scheduler.admit("background")
+
+        # A chat call sheds the lowest-priority waiter instead
+        chat = asyncio.create_task(scheduler.acquire("chat", 10))
+        await _settle()
+        with pytest.raises(LLMOverloaded):
+            await background
+        assert scheduler.rejected["background"] == 3
+
+        scheduler.release()
+        await chat
+        scheduler.release()
+        await generation
+        scheduler.release()
+        assert not any(scheduler.stats()["queued"].values())
+
+    asyncio.run(run())
+
+
+def test_request_path_calls_time_out_but_background_waits():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1, quotas=UNLIMITED, queue_timeout=0.05)
+        await scheduler.acquire("chat", 10)
+
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire("grading", 10)
+        assert scheduler.rejected["grading"] == 1
+        assert not any(scheduler.stats()["queued"].values())
+
+        background = asyncio.create_task(scheduler.acquire("background", 10))
+        await asyncio.sleep(0.1)
+        assert not background.done()
+        scheduler.release()
+        await asyncio.wait_for(background, 1)
+
+    asyncio.run(run())
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one per second
+    start = bucket.updated
+    bucket.take(60, now=start)
+    # A request larger than the whole quota waits for a full bucket, not forever
+    assert bucket.wait_time(120, now=start) == pytest.approx(60.0)
+    assert bucket.wait_time(1, now=start) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now=start + 1.0) == 0.0
+    assert TokenBucket(0).wait_time(10 ** 6, now=0.0) == 0.0
+
+
+def test_model_quota_honours_retry_after():
+    quota = ModelQuota(requests_per_minute=0, tokens_per_minute=0)
+    now = quota.requests.updated
+    quota.blocked_until = now + 5
+    assert quota.wait_time(10, now) == pytest.approx(5.0)
+    assert quota.wait_time(10, now + 5) == 0.0
+
+
+def test_each_model_has_its_own_budget():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=10, quotas={
+            AI_MODEL: {"requests_per_minute": 5, "tokens_per_minute": 0},
+            "big": {"requests_per_minute": 1, "tokens_per_minute": 0},
+            "small": {"requests_per_minute": 2, "tokens_per_minute": 0},
+        })
+        await scheduler.acquire("chat", 10, model="big")
+
+        # "big" is out of requests; its next call waits, even at top priority ...
+        blocked = asyncio.create_task(scheduler.acquire("chat", 10, model="big"))
+        await _settle()
+        assert not blocked.done()
+
+        # ... while a lower-priority call on "small" is not held behind it
+        await asyncio.wait_for(scheduler.acquire("generation", 10, model="small"), 1)
+
+        # A retry-after pause on "small" leaves "big" untouched and vice versa
+        scheduler.pause(30, model="small")
+        assert scheduler.quota("small").blocked_until > scheduler.quota("big").blocked_until
+        assert not scheduler.try_acquire("chat", 10, model="small")
+
+        blocked.cancel()
+        await _settle()
+        assert not any(scheduler.stats()["queued"].values())
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    # Models without their own entry fall back to AI_MODEL's quota
+    assert scheduler.quota("unlisted").requests.capacity == 5
+
+
+# --- CircuitBreaker ---
+
+def test_breaker_opens_on_failures_and_closes_after_a_good_probe():
+    breaker = CircuitBreaker(window=4, min_calls=4, threshold=0.5, cooldown=60)
+    for ok in (True, False, True):
+        breaker.record(ok)
+    assert breaker.state == "closed"
+    breaker.record(False)  # 2 of 4 failed
+    assert breaker.state == "open"
+    with pytest.raises(LLMCircuitOpen):
+        breaker.check()
+
+    breaker.cooldown = 0
+    probe = breaker.check()
+    assert breaker.state == "half_open" and probe is not None
+    with pytest.raises(LLMCircuitOpen):
+        breaker.check()  # one probe at a time
+    breaker.record(True)
+    breaker.finish(probe)
+    assert breaker.state == "closed"
+    assert breaker.check() is None
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(window=2, min_calls=2, threshold=0.5, cooldown=0)
+    breaker.record(False)
+    breaker.record(False)
+    probe = breaker.check()
+    breaker.record(False)
+    breaker.finish(probe)
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+
+def test_probe_without_an_outcome_frees_the_half_open_slot():
+    breaker = CircuitBreaker(window=2, min_calls=2, threshold=0.5, cooldown=0)
+    breaker.record(False)
+    breaker.record(False)
+    stale = breaker.check()
+    breaker.finish(stale)  # e.g. cancelled before Groq answered
+    assert breaker.state == "half_open"
+    probe = breaker.check()  # the next call may probe at once
+    breaker.finish(stale)  # a stale token does not free the new probe's slot
+    with pytest.raises(LLMCircuitOpen):
+        breaker.check()
+    breaker.finish(probe)
+    assert breaker.check() is not None
+
+
+def test_rejected_request_does_not_wedge_a_half_open_breaker():
+    async def run():
+        tutor = AITutor()
+        tutor.scheduler = LLMScheduler(quotas=UNLIMITED)
+        tutor.breaker = CircuitBreaker(window=2, min_calls=2, threshold=0.5, cooldown=0)
+        tutor.breaker.record(False)
+        tutor.breaker.record(False)
+
+        # A 400 says nothing about Groq's health, so it is recorded as neither outcome
+        transport = httpx.MockTransport(lambda request: httpx.Response(400, json={}))
+        async with httpx.AsyncClient(transport=transport, base_url="http://groq.test") as client:
+            payload = tutor._payload("hi", task="tutor_chat")
+            with pytest.raises(LLMUpstreamError):
+                await tutor._call_with_retries(client, payload, "chat")
+        assert tutor.breaker.state == "half_open"
+        assert tutor.breaker.check() is not None
+
+    asyncio.run(run())
+
+
+# --- SingleFlight ---
+
+def test_singleflight_coalesces_identical_calls():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "answer"
+
+        waiters = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+        await _settle()
+        release.set()
+        results = await asyncio.gather(*waiters)
+        assert results == ["answer"] * 3
+        assert calls == 1 and flight.coalesced == 2
+        assert flight.stats()["in_flight"] == 0
+
+        # Once settled, the next call goes upstream again
+        assert await flight.do("key", fetch) == "answer"
+        assert calls == 2
+
+    asyncio.run(run())
+
+
+def test_singleflight_fans_errors_out_to_every_waiter():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            raise LLMTimeout("slow")
+
+        waiters = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+        await _settle()
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(r, LLMTimeout) for r in results)
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_singleflight_survives_a_cancelled_leader():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        started = 0
+
+        async def fetch():
+            nonlocal started
+            started += 1
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("key", fetch))
+        follower = asyncio.create_task(flight.do("key", fetch))
+        await _settle()
+        leader.cancel()
+        await _settle()
+        assert leader.cancelled()
+        release.set()
+        assert await follower == "answer"
+        assert started == 1
+
+        # When every waiter gives up the upstream call is cancelled and forgotten
+        release.clear()
+        only = asyncio.create_task(flight.do("key", fetch))
+        await _settle()
+        only.cancel()
+        await _settle()
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+# --- ProblemStreamParser ---
+
+def test_stream_parser_emits_sections_as_markers_arrive():
+    parser = ProblemStreamParser()
+    assert parser.feed("QUESTION: What is 2") == []
+    # The marker is split across chunks
+    assert parser.feed(" + 2?\nSOLU") == []
+    assert parser.feed("TION: 2 + 2 = 4\nHI") == [("question", "What is 2 + 2?")]
+    assert parser.feed("NTS: add;count") == [("solution", "2 + 2 = 4")]
+    assert parser.close() == [("hints", ["add", "count"])]
+    assert parser.result() == {"question": "What is 2 + 2?", "solution": "2 + 2 = 4", "hints": ["add", "count"]}
+
+
+def test_stream_parser_without_hints_or_markers():
+    parser = ProblemStreamParser()
+    parser.feed("QUESTION: Name a prime.\nSOLUTION: 7")
+    assert parser.close() == [("solution", "7"), ("hints", [])]
+
+    parser = ProblemStreamParser()
+    parser.feed("Sorry, I can't help with that.")
+    assert parser.close() == [
+        ("question", "Sorry, I can't help with that."),
+        ("solution", "Solution generation failed"),
+        ("hints", []),
+    ]
@@ -0,0 +1,98 @@
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+load_dotenv(Path(__file__).parent / ".env")
+
+from models import User
+
+# Known users kept in memory; users never get deleted, so positive entries do not expire
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# How long a "no such user" answer is trusted (another worker may create the user)
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "30"))
+
+
+def user_to_dict(user: User) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "created_at": user.created_at
+    }
+
+
+class UserRegistry:
+    """LRU cache of user rows so hot endpoints can skip the existence SELECT"""
+
+    def __init__(self, max_entries: int = USER_CACHE_SIZE, negative_ttl: float = USER_CACHE_NEGATIVE_TTL):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._users = OrderedDict()  # user_id -> user dict
+        self._missing = {}  # user_id -> expires_at
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, user: User):
+        self._missing.pop(user.id, None)
+        self._users[user.id] = user_to_dict(user)
+        self._users.move_to_end(user.id)
+        while len(self._users) > self.max_entries:
+            self._users.popitem(last=False)
+
+    def mark_missing(self, user_id: int):
+        self._users.pop(user_id, None)
+        self._missing[user_id] = time.monotonic() + self.negative_ttl
+        if len(self._missing) > self.max_entries:
+            # Drop expired negatives first; if still too many, start over
+            now = time.monotonic()
+            self._missing = {k: v for k, v in self._missing.items() if v > now}
+            if len(self._missing) > self.max_entries:
+                self._missing.clear()
+
+    def known_missing(self, user_id: int) -> bool:
+        """True only if a recent lookup found no such user (no DB access)"""
+        expires_at = self._missing.get(user_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._missing[user_id]
+            return False
+        return True
+
+    async def get(self, db: AsyncSession, user_id: int):
+        """Return the user as a dict, or None; only cache misses touch the database"""
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return user
+        if self.known_missing(user_id):
+            self.hits += 1
+            return None
+
+        self.misses += 1
+        result = await db.execute(select(User).where(User.id == user_id))
+        row = result.scalar_one_or_none()
+        if row is None:
+            self.mark_missing(user_id)
+            return None
+        self.remember(row)
+        return self._users[user_id]
+
+    async def exists(self, db: AsyncSession, user_id: int) -> bool:
+        return await self.get(db, user_id) is not None
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "users": len(self._users),
+            "missing": len(self._missing),
+        }
+
+
+user_registry = UserRegistry()
@@ -7,16 +7,54 @@ const ChatInterface = ({ userId }) => {
   const [input, setInput] = useState('');
   const [topic, setTopic] = useState('');
   const [loading, setLoading] = useState(false);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const messagesEndRef = useRef(null);
+  const sessionRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
   useEffect(() => {
+    if (skipScrollRef.current) {
+      // Older history was prepended; keep the reader where they were
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
+  const loadHistory = async (before = null) => {
+    try {
+      const page = await apiService.getConversations(userId, before);
+      const older = page.conversations
+        .slice()
+        .reverse()
+        .flatMap((conv) => [
+          { role: 'user', content: conv.message },
+          { role: 'assistant', content: conv.response },
+        ]);
+      skipScrollRef.current = before !== null;
+      setMessages((prev) => [...older, ...prev]);
+      setHistoryCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error loading history:', error);
+    }
+  };
+
+  useEffect(() => {
+    loadHistory();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [userId]);
+
+  useEffect(() => {
+    // One socket per visit; the server keeps the session's history between messages
+    const session = apiService.connectTutorSession(userId);
+    sessionRef.current = session;
+    return () => session.close();
+  }, [userId]);
+
   const handleSend = async () => {
     if (!input.trim()) return;
 
@@ -25,10 +63,29 @@ const ChatInterface = ({ userId }) => {
     setInput('');
     setLoading(true);
 
+    let started = false;
+    const onDelta = (delta) => {
+      if (!started) {
+        // First token: swap the typing indicator for the streaming reply
+        started = true;
+        setLoading(false);
+        setMessages((prev) => [...prev, { role: 'assistant', content: delta }]);
+        return;
+      }
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, content: last.content + delta }];
+      });
+    };
+
     try {
-      const response = await apiService.chatWithTutor(userId, input, topic || null);
-      const aiMessage = { role: 'assistant', content: response.response };
-      setMessages((prev) => [...prev, aiMessage]);
+      const session = sessionRef.current;
+      if (session && session.isOpen()) {
+        await session.send(input, topic || null, onDelta);
+      } else {
+        // Socket not connected (yet): fall back to the HTTP stream
+        await apiService.chatWithTutorStream(userId, input, topic || null, onDelta);
+      }
     } catch (error) {
       console.error('Error:', error);
       const errorMessage = {
@@ -61,6 +118,11 @@ const ChatInterface = ({ userId }) => {
       </div>
 
       <div style={styles.messagesContainer}>
+        {historyCursor && (
+          <button onClick={() => loadHistory(historyCursor)} style={styles.loadOlderButton}>
+            Load older messages
+          </button>
+        )}
         {messages.length === 0 ? (
           <div style={styles.emptyState}>
             <Bot size={64} color="#94a3b8" />
@@ -150,6 +212,17 @@ const styles = {
     padding: '1.5rem',
     backgroundColor: '#f8fafc',
   },
+  loadOlderButton: {
+    display: 'block',
+    margin: '0 auto 1rem',
+    padding: '0.4rem 1rem',
+    fontSize: '0.85rem',
+    color: '#475569',
+    backgroundColor: '#fff',
+    border: '1px solid #e2e8f0',
+    borderRadius: '999px',
+    cursor: 'pointer',
+  },
   emptyState: {
     display: 'flex',
     flexDirection: 'column',
@@ -22,10 +22,18 @@ const ProblemGenerator = () => {
     setLoading(true);
     setAssessment(null);
     setUserAnswer('');
+    setProblem(null);
+    setShowHints(false);
     try {
-      const response = await apiService.generateProblem(topic, difficulty, problemType);
-      setProblem(response);
-      setShowHints(false);
+      // The question renders as soon as it streams in; solution and hints fill in afterwards
+      await apiService.generateProblemStream(topic, difficulty, problemType, (section, data) => {
+        if (section === 'question') {
+          setProblem({ ...data, solution: null, hints: [] });
+          setLoading(false);
+        } else {
+          setProblem((current) => ({ ...current, ...data }));
+        }
+      });
     } catch (error) {
       console.error('Error generating problem:', error);
       alert('Failed to generate problem. Please try again.');
@@ -180,14 +188,14 @@ const ProblemGenerator = () => {
             {!assessment ? (
               <button 
                 onClick={submitAnswer} 
-                disabled={submitting || !userAnswer.trim()}
+                disabled={submitting || !userAnswer.trim() || !problem.solution}
                 style={{
                   ...styles.submitButton,
-                  opacity: (submitting || !userAnswer.trim()) ? 0.5 : 1,
-                  cursor: (submitting || !userAnswer.trim()) ? 'not-allowed' : 'pointer'
+                  opacity: (submitting || !userAnswer.trim() || !problem.solution) ? 0.5 : 1,
+                  cursor: (submitting || !userAnswer.trim() || !problem.solution) ? 'not-allowed' : 'pointer'
                 }}
               >
-                {submitting ? 'Evaluating...' : 'Submit Answer'}
+                {submitting ? 'Evaluating...' : !problem.solution ? 'Preparing answer key...' : 'Submit Answer'}
               </button>
             ) : (
               <div style={{
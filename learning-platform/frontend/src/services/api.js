@@ -1,6 +1,7 @@
 import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:8000';
+const WS_BASE_URL = API_BASE_URL.replace(/^http/, 'ws');
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -9,6 +10,43 @@ const api = axios.create({
   },
 });
 
+// POST and read a Server-Sent Events response, calling onEvent(name, data) per event
+const postEventStream = async (path, body, onEvent) => {
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok) {
+    throw new Error(`Stream ${path} failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const event of events) {
+      const lines = event.split('\n');
+      const dataLine = lines.find((line) => line.startsWith('data: '));
+      if (!dataLine) continue;
+      const eventLine = lines.find((line) => line.startsWith('event: '));
+      const name = eventLine ? eventLine.slice('event: '.length) : 'message';
+      const data = JSON.parse(dataLine.slice('data: '.length));
+      if (name === 'error') {
+        throw new Error(data.detail);
+      }
+      onEvent(name, data);
+    }
+  }
+};
+
 export const apiService = {
   // Health check
   healthCheck: async () => {
@@ -32,6 +70,14 @@ export const apiService = {
     return response.data;
   },
 
+  // Chat history, newest first; pass nextCursor back as `before` for older pages
+  getConversations: async (userId, before = null, limit = 20) => {
+    const response = await api.get(`/api/users/${userId}/conversations`, {
+      params: { limit, ...(before ? { before } : {}) },
+    });
+    return response.data;
+  },
+
   // Chat with AI tutor
   chatWithTutor: async (userId, message, topic = null) => {
     const response = await api.post('/api/chat', {
@@ -42,6 +88,54 @@ export const apiService = {
     return response.data;
   },
 
+  // Chat with AI tutor, streaming tokens over Server-Sent Events
+  chatWithTutorStream: async (userId, message, topic = null, onDelta = () => {}) => {
+    let result = {};
+    await postEventStream('/api/chat/stream', { user_id: userId, message, topic }, (event, data) => {
+      if (event === 'done') {
+        result = data;
+      } else if (data.delta) {
+        onDelta(data.delta);
+      }
+    });
+    return result;
+  },
+
+  // Tutor session over a WebSocket; send() streams deltas to onDelta and resolves with the done event
+  connectTutorSession: (userId) => {
+    const socket = new WebSocket(`${WS_BASE_URL}/ws/chat/${userId}`);
+    let current = null; // { onDelta, resolve, reject } for the message in flight
+
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (!current) return;
+      if (data.type === 'delta') {
+        current.onDelta(data.delta);
+      } else if (data.type === 'done') {
+        current.resolve(data);
+        current = null;
+      } else if (data.type === 'error') {
+        current.reject(new Error(data.detail));
+        current = null;
+      }
+    };
+    socket.onclose = () => {
+      if (current) {
+        current.reject(new Error('Tutor session closed'));
+        current = null;
+      }
+    };
+
+    return {
+      isOpen: () => socket.readyState === WebSocket.OPEN && current === null,
+      send: (message, topic = null, onDelta = () => {}) => new Promise((resolve, reject) => {
+        current = { onDelta, resolve, reject };
+        socket.send(JSON.stringify({ message, topic }));
+      }),
+      close: () => socket.close(),
+    };
+  },
+
   // Problem generation
   generateProblem: async (topic, difficulty = 5.0, problemType = 'open_ended') => {
     const response = await api.post('/api/problems/generate', {
@@ -52,6 +146,15 @@ export const apiService = {
     return response.data;
   },
 
+  // Problem generation, streamed: onSection(name, data) fires for question, solution, hints and done
+  generateProblemStream: async (topic, difficulty = 5.0, problemType = 'open_ended', onSection = () => {}) => {
+    await postEventStream('/api/problems/generate/stream', {
+      topic,
+      difficulty,
+      problem_type: problemType,
+    }, onSection);
+  },
+
   // Submit answer
   submitAnswer: async (userId, problemId, answer) => {
     const response = await api.post('/api/problems/submit', {
@@ -74,6 +177,15 @@ export const apiService = {
     return response.data;
   },
 
+  // Grade a whole quiz; items are { topic_name, question, answer, solution }
+  assessBatch: async (userId, items) => {
+    const response = await api.post('/api/problems/assess-batch', {
+      user_id: userId,
+      items,
+    });
+    return response.data;
+  },
+
   // Learning path
   generateLearningPath: async (subject, currentLevel = 'beginner', goals = '') => {
     const response = await api.post('/api/learning-path', {